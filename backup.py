@@ -0,0 +1,162 @@
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+# Seconds between scheduled snapshots and number of snapshots kept
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", str(6 * 3600)))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+# Seconds between WAL checks, and the WAL size above which it is truncated
+CHECKPOINT_INTERVAL = 60
+WAL_TRUNCATE_BYTES = 16 * 1024 * 1024
+
+SNAPSHOT_PREFIX = "bot_data-"
+SNAPSHOT_SUFFIX = ".db.gz"
+
+class BackupError(Exception):
+    """Raised when a snapshot cannot be created, verified or restored."""
+
+def snapshot_label(name: str) -> str:
+    """Return the label of a snapshot file name, or None for a scheduled snapshot."""
+    stamp_and_label = name[len(SNAPSHOT_PREFIX):-len(SNAPSHOT_SUFFIX)]
+    # The stamp is YYYYmmdd-HHMMSS-ffffff, followed by -<label> if any
+    return stamp_and_label[23:] or None
+
+def integrity_check(db_file: str) -> str:
+    """Run SQLite's integrity check on a database file; returns 'ok' when it is sound."""
+    conn = sqlite3.connect(db_file)
+    try:
+        rows = conn.execute('PRAGMA integrity_check').fetchall()
+    except sqlite3.DatabaseError as e:
+        return str(e)
+    finally:
+        conn.close()
+    return "\n".join(row[0] for row in rows)
+
+class BackupManager:
+    """Online, compressed and rotated snapshots of the bot's database."""
+
+    def __init__(self, db: Database, backup_dir: str = BACKUP_DIR, keep: int = BACKUP_KEEP):
+        self.db = db
+        self.backup_dir = backup_dir
+        self.keep = keep
+
+    def list_snapshots(self) -> list:
+        """Return snapshot file names, newest first."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        return sorted(
+            (name for name in os.listdir(self.backup_dir)
+             if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)),
+            reverse=True
+        )
+
+    def _snapshot_path(self, name: str) -> str:
+        if os.path.basename(name) != name or name not in self.list_snapshots():
+            raise BackupError(f"Unknown snapshot: {name}")
+        return os.path.join(self.backup_dir, name)
+
+    def create_snapshot(self, label: str = None, rotate: bool = True) -> str:
+        """Copy the live database, verify the copy, compress it and rotate old snapshots.
+
+        Snapshots are rotated per label, so labelled ones such as pre-restore
+        snapshots never push out scheduled ones.
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        self.db.flush_mod_actions()
+
+        fd, copy_path = tempfile.mkstemp(suffix=".db", dir=self.backup_dir)
+        os.close(fd)
+        try:
+            source = sqlite3.connect(self.db.db_file)
+            target = sqlite3.connect(copy_path)
+            try:
+                # One step copies under a single read snapshot. In WAL mode that
+                # does not block writers, while a stepped copy would restart on
+                # every write made between steps and may never finish
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+
+            result = integrity_check(copy_path)
+            if result != "ok":
+                raise BackupError(f"Snapshot failed the integrity check: {result}")
+
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            name = f"{SNAPSHOT_PREFIX}{stamp}{'-' + label if label else ''}{SNAPSHOT_SUFFIX}"
+            path = os.path.join(self.backup_dir, name)
+            with open(copy_path, "rb") as src, gzip.open(path + ".part", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(path + ".part", path)
+        finally:
+            os.remove(copy_path)
+
+        if rotate:
+            self._rotate(label)
+        logger.info("Created database snapshot %s", name)
+        return name
+
+    def _rotate(self, label: str = None):
+        snapshots = [name for name in self.list_snapshots() if snapshot_label(name) == label]
+        for name in snapshots[self.keep:]:
+            os.remove(os.path.join(self.backup_dir, name))
+
+    def restore_snapshot(self, name: str) -> str:
+        """Replace the live database with a verified snapshot.
+
+        A snapshot of the current state is taken first, so a restore can be
+        undone. Returns the name of that safety snapshot.
+        """
+        path = self._snapshot_path(name)
+
+        fd, copy_path = tempfile.mkstemp(suffix=".db", dir=self.backup_dir)
+        os.close(fd)
+        try:
+            with gzip.open(path, "rb") as src, open(copy_path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            result = integrity_check(copy_path)
+            if result != "ok":
+                raise BackupError(f"Snapshot failed the integrity check: {result}")
+
+            # Rotated once the restore is done, so the snapshot being
+            # restored cannot be deleted underneath it
+            safety = self.create_snapshot(label="pre-restore", rotate=False)
+
+            # The backup API writes into the open database file in place, so
+            # other connections see the restored content without reopening
+            source = sqlite3.connect(copy_path)
+            target = sqlite3.connect(self.db.db_file)
+            try:
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+        finally:
+            os.remove(copy_path)
+
+        self._rotate("pre-restore")
+        # Older snapshots may predate the current schema
+        self.db.init_db()
+        self.db.reset_caches()
+        logger.info("Restored database snapshot %s", name)
+        return safety
+
+    def checkpoint(self) -> tuple:
+        """Apply the WAL checkpoint policy.
+
+        A passive checkpoint never blocks; once the WAL has grown past
+        WAL_TRUNCATE_BYTES anyway, a truncating checkpoint resets it to zero.
+        """
+        wal_file = self.db.db_file + "-wal"
+        wal_size = os.path.getsize(wal_file) if os.path.exists(wal_file) else 0
+        mode = "TRUNCATE" if wal_size > WAL_TRUNCATE_BYTES else "PASSIVE"
+        return mode, self.db.checkpoint_wal(mode)
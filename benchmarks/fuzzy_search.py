@@ -0,0 +1,85 @@
+"""Time fuzzy and substring note search over a generated corpus.
+
+The corpus is spread over ``--users`` users and indexed through
+Database.import_notes, the same path uploads take. Pass ``--db`` to keep the
+corpus file and reuse it on the next run.
+
+    python benchmarks/fuzzy_search.py --notes 1000000 --users 100
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+
+WORDS = (
+    "groceries", "meeting", "birthday", "party", "dentist", "appointment", "recipe",
+    "pasta", "budget", "invoice", "holiday", "flight", "hotel", "garden", "tomatoes",
+    "project", "deadline", "review", "homework", "math", "exam", "gym", "running",
+    "shopping", "list", "milk", "bread", "coffee", "tea", "books", "library", "movie",
+    "tickets", "concert", "doctor", "pharmacy", "rent", "electricity", "bill", "car",
+    "service", "insurance", "passport", "renewal", "wedding", "gift", "ideas", "call",
+    "mom", "dad", "team", "sync", "notes", "plan", "weekend", "trip", "camping", "tent",
+)
+# Typos, partial words and exact words
+QUERIES = ("grocries", "meating", "birthdy party", "dentist", "pasta recipe", "zzqx")
+REPEAT = 5
+
+def generate_notes(count: int, rng: random.Random):
+    now = datetime.now()
+    for _ in range(count):
+        yield {
+            'type': 'note',
+            'title': " ".join(rng.sample(WORDS, rng.randint(2, 4))).capitalize(),
+            'content': " ".join(rng.choices(WORDS, k=rng.randint(4, 10))),
+            'tags': rng.sample(WORDS, rng.randint(0, 2)),
+            'updated_at': (now - timedelta(days=rng.uniform(0, 365))).isoformat(),
+        }
+
+def build_corpus(db: Database, notes: int, users: int, seed: int):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    per_user, extra = divmod(notes, users)
+    for user_id in range(1, users + 1):
+        count = per_user + (1 if user_id <= extra else 0)
+        db.import_notes(user_id, generate_notes(count, rng), user_id)
+    print(f"Indexed {notes:,} notes for {users:,} users in {time.perf_counter() - started:.1f} s")
+
+def time_query(search, user_id: int, query: str):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        results = search(user_id, query)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, len(results)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--db", help="corpus file, built when missing and kept afterwards")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db or os.path.join(tmp, "corpus.db")
+        build = not os.path.exists(db_file)
+        db = Database(db_file)
+        if build:
+            build_corpus(db, args.notes, args.users, args.seed)
+
+        print(f"\n{'query':<16} {'fuzzy ms':>9} {'hits':>5} {'substring ms':>13} {'hits':>5}")
+        for query in QUERIES:
+            fuzzy_ms, fuzzy_hits = time_query(db.fuzzy_search_notes, 1, query)
+            like_ms, like_hits = time_query(db.search_notes, 1, query)
+            print(f"{query:<16} {fuzzy_ms:9.1f} {fuzzy_hits:5d} {like_ms:13.1f} {like_hits:5d}")
+
+if __name__ == '__main__':
+    main()
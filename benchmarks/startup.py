@@ -0,0 +1,128 @@
+"""Measure the time from process start to the first handled update.
+
+Each run starts ``python bot.py`` in a fresh process against a local stand-in
+for the Bot API: getUpdates hands out a single /start message and the run
+ends when the bot sends its reply. Cold runs start from an empty database,
+warm runs reuse the database of the previous run, as after a restart.
+
+    python benchmarks/startup.py --runs 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+START_UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 42, "type": "private", "first_name": "Bench"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Bench", "language_code": "en"},
+        "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    },
+}
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+def run_bot():
+    """Run bot.main() with its requests answered in process instead of by Telegram."""
+    sys.path.insert(0, REPO_DIR)
+    # Imported first, so its import phase is timed as in production
+    import bot
+    from telegram.ext import ApplicationBuilder
+    from telegram.request import BaseRequest
+
+    class LocalBotAPI(BaseRequest):
+        application = None
+        updates = [START_UPDATE]
+        replied = False
+        stopping = False
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url, method, request_data=None, **timeouts):
+            endpoint = url.rsplit("/", 1)[-1]
+            if endpoint == "getMe":
+                result = BOT_USER
+            elif endpoint == "getUpdates":
+                result, LocalBotAPI.updates = LocalBotAPI.updates, []
+                if not result:
+                    await asyncio.sleep(0.1)
+                    if LocalBotAPI.replied and not LocalBotAPI.stopping:
+                        # Stop from a later poll, once run_polling is idling
+                        LocalBotAPI.stopping = True
+                        LocalBotAPI.application.stop_running()
+            elif endpoint == "sendMessage":
+                print(json.dumps({"replied_at": time.time()}), flush=True)
+                LocalBotAPI.replied = True
+                result = {"message_id": 2, "date": 0, "chat": START_UPDATE["message"]["chat"]}
+            else:
+                result = True
+            return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    build = ApplicationBuilder.build
+
+    def build_offline(builder):
+        builder.request(LocalBotAPI()).get_updates_request(LocalBotAPI())
+        LocalBotAPI.application = build(builder)
+        return LocalBotAPI.application
+
+    ApplicationBuilder.build = build_offline
+    bot.main()
+
+def time_run(workdir: str):
+    """Return seconds to the first reply and the bot's own startup report."""
+    spawned_at = time.time()
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        cwd=workdir, capture_output=True, text=True, timeout=120,
+    )
+    replies = [json.loads(line) for line in proc.stdout.splitlines() if line.startswith("{")]
+    if not replies:
+        raise RuntimeError(f"bot exited without replying:\n{proc.stderr}")
+    lines = proc.stderr.splitlines()
+    start = next((i for i, line in enumerate(lines) if line.endswith("Startup timing:")), len(lines))
+    report = ["Startup timing:"]
+    for line in lines[start + 1:]:
+        if not line.startswith("  "):
+            break
+        report.append(line)
+    return replies[0]["replied_at"] - spawned_at, "\n".join(report)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_bot()
+        return
+
+    cold, warm = [], []
+    report = ""
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            cold.append(time_run(workdir)[0])
+            elapsed, report = time_run(workdir)
+            warm.append(elapsed)
+
+    for name, timings in (("cold", cold), ("warm", warm)):
+        print(f"{name:<5} median {statistics.median(timings) * 1000:7.1f} ms"
+              f"   min {min(timings) * 1000:7.1f} ms")
+    print("\nLast warm run, as logged by the bot:")
+    print(report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Measure welcome-card render throughput.
+
+Renders ``--cards`` cards with render_card in this process, then through
+WelcomeCardRenderer with 1..``--workers`` worker processes, and checks how
+long the event loop stalls while cards are rendered in the pool.
+
+    python benchmarks/welcome_cards.py --cards 200 --workers 4
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from welcome_card import AVATAR_SIZE, CARD_SIZE, WelcomeCardRenderer, render_card
+
+def sample_photo(size, color) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, format="JPEG")
+    return out.getvalue()
+
+def card_args(count: int):
+    avatar = sample_photo((AVATAR_SIZE * 3, AVATAR_SIZE * 3), (200, 120, 80))
+    banner = sample_photo((CARD_SIZE[0] * 2, CARD_SIZE[1] * 2), (40, 90, 160))
+    for i in range(count):
+        # Alternate plain cards and cards with both photos
+        photos = (avatar, banner) if i % 2 else (None, None)
+        yield (f"Member {i}", "Benchmark Group", *photos)
+
+async def max_loop_stall(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Sleep in short steps and return the longest overshoot seen."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+async def render_in_pool(workers: int, cards: list):
+    renderer = WelcomeCardRenderer(workers)
+    try:
+        # Spawn the workers and decode the assets before timing
+        await asyncio.gather(*(renderer.render(*cards[0]) for _ in range(workers)))
+        stop = asyncio.Event()
+        stall = asyncio.create_task(max_loop_stall(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(renderer.render(*args) for args in cards))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        return elapsed, await stall
+    finally:
+        renderer.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    cards = list(card_args(args.cards))
+
+    render_card(*cards[0])
+    started = time.perf_counter()
+    for card in cards:
+        render_card(*card)
+    elapsed = time.perf_counter() - started
+    print(f"{'in process':<12} {args.cards / elapsed:8.1f} cards/s")
+
+    for workers in range(1, args.workers + 1):
+        elapsed, stall = asyncio.run(render_in_pool(workers, cards))
+        print(f"{f'pool of {workers}':<12} {args.cards / elapsed:8.1f} cards/s"
+              f"   longest loop stall {stall * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
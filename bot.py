@@ -1,20 +1,61 @@
+import time
+STARTED_AT = time.perf_counter()
+
+import asyncio
+import csv
+import gzip
+import html
+import io
+import json
 import logging
 import os
+import sqlite3
+import tempfile
+import zlib
 from datetime import datetime, timezone
+from functools import lru_cache
+from string import Formatter
 import pytz
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatPermissions
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    ChatPermissions,
+    InlineQueryResultArticle,
+    InputTextMessageContent
+)
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     ContextTypes,
     filters,
-    ConversationHandler
+    ConversationHandler,
+    TypeHandler
 )
 from telegram.constants import ParseMode
-from database import Database
+from telegram.error import BadRequest, Forbidden
+from telegram.helpers import escape_markdown
+from backup import BackupManager, BackupError, BACKUP_INTERVAL, CHECKPOINT_INTERVAL
+from database import Database, MOD_ACTION_COLUMNS, MOD_ACTION_FLUSH_INTERVAL
+from i18n import Catalog, DEFAULT_LANGUAGE
+from notifications import (
+    DELIVERY_MODES,
+    DIGEST_BATCH_USERS,
+    DIGEST_MAX_LINES,
+    NOTIFICATION_INTERVAL,
+    NOTIFICATION_KINDS,
+    next_digest_at
+)
+from persistence import SQLitePersistence
+from startup import StartupTimer
+from welcome_card import WelcomeCardRenderer, AVATAR_SIZE, TEMPLATE_VERSION, card_fingerprint
+
+startup = StartupTimer(STARTED_AT)
+startup.mark("imports")
 
 # Load environment variables
 load_dotenv()
@@ -24,112 +65,137 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
+logger = logging.getLogger(__name__)
 
 # Bot token from environment variable
 TOKEN = os.getenv("BOT_TOKEN", "7660169417:AAFBkJ5gFLIcXc1jxW0HyBfDGjYaDb0gaWw")
 
 # Initialize database
+startup.mark("environment")
 db = Database()
+startup.mark("database")
+
+# Reply templates of all languages, compiled once
+catalog = Catalog()
+startup.mark("catalog")
+
+# Online snapshots of the database
+backups = BackupManager(db)
+
+# Welcome card renderer (process pool, started on first use)
+welcome_cards = WelcomeCardRenderer()
 
 # Conversation states
 TITLE, CONTENT, TAGS = range(3)
 REMINDER_TIME = range(1)
 
+# Abandoned /newnote drafts are discarded after this many seconds
+NOTE_CONVERSATION_TIMEOUT = 15 * 60
+NOTE_DRAFT_KEYS = ('note_title', 'note_content')
+
+# Conversation state and user_data survive restarts
+persistence = SQLitePersistence(db, conversation_timeout=NOTE_CONVERSATION_TIMEOUT)
+
 # Store admin user IDs (you can add admin IDs here)
 ADMIN_IDS = []
 
-# Basic Commands
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Send a message when the command /start is issued."""
+# Moderation log page size
+MOD_LOG_PAGE_SIZE = 10
+
+# Handler group of the first-update hook, after all others
+FIRST_UPDATE_GROUP = 100
+
+# Version of the /exportnotes file format
+NOTES_EXPORT_VERSION = 1
+
+# Longest message Telegram accepts, and the most messages a note is split
+# into before it is sent as a file instead
+MESSAGE_LIMIT = 4096
+NOTE_MAX_PARTS = 5
+
+# Moderation actions the affected user is notified about
+MOD_ALERT_ACTIONS = ('warn', 'unwarn', 'ban', 'unban', 'mute', 'unmute')
+
+# Inline note search: Telegram-side cache time, local result cache TTL and size
+INLINE_CACHE_TIME = 10
+INLINE_RESULT_TTL = 10.0
+INLINE_RESULT_CACHE_SIZE = 1024
+INLINE_RESULT_LIMIT = 20
+inline_results = {}
+
+# Localization
+def user_language(update: Update) -> str:
+    """Pick the reply language: the user's stored choice, else their Telegram client's."""
     user = update.effective_user
-    welcome_message = (
-        f"👋 Hi {user.mention_html()}!\n\n"
-        "I'm your multipurpose Telegram bot. Here's what I can do:\n\n"
-        "🔹 Store notes and reminders\n"
-        "🔹 Manage groups\n"
-        "🔹 Customize your preferences\n"
-        "🔹 And much more!\n\n"
-        "Use /help to see all available commands."
-    )
-    
-    keyboard = [
+    if user is None:
+        return DEFAULT_LANGUAGE
+    language = db.get_user_language(user.id)
+    if language is None and user.language_code:
+        language = user.language_code.split('-')[0].lower()
+    return language if catalog.supports(language) else DEFAULT_LANGUAGE
+
+def stored_language(user_id: int) -> str:
+    """The language a user picked, for messages that do not answer one of their updates."""
+    language = db.get_user_language(user_id)
+    return language if catalog.supports(language) else DEFAULT_LANGUAGE
+
+def tr(update: Update, key: str, **kwargs) -> str:
+    """Render a reply in the language of the update's user."""
+    return catalog.get(user_language(update), key, **kwargs)
+
+@lru_cache(maxsize=None)
+def start_keyboard(language: str) -> InlineKeyboardMarkup:
+    """The /start keyboard, built once per language."""
+    return InlineKeyboardMarkup([
         [
-            InlineKeyboardButton("📝 Notes", callback_data="help_notes"),
-            InlineKeyboardButton("⏰ Reminders", callback_data="help_reminders")
+            InlineKeyboardButton(catalog.get(language, "button_notes"), callback_data="help_notes"),
+            InlineKeyboardButton(catalog.get(language, "button_reminders"), callback_data="help_reminders")
         ],
         [
-            InlineKeyboardButton("⚙️ Preferences", callback_data="help_preferences"),
-            InlineKeyboardButton("ℹ️ About", callback_data="about")
+            InlineKeyboardButton(catalog.get(language, "button_preferences"), callback_data="help_preferences"),
+            InlineKeyboardButton(catalog.get(language, "button_about"), callback_data="about")
         ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_html(welcome_message, reply_markup=reply_markup)
+    ])
+
+@lru_cache(maxsize=None)
+def theme_keyboard(language: str) -> InlineKeyboardMarkup:
+    """The /theme keyboard, built once per language."""
+    return InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(catalog.get(language, "button_theme_light"), callback_data="theme_light"),
+            InlineKeyboardButton(catalog.get(language, "button_theme_dark"), callback_data="theme_dark")
+        ]
+    ])
+
+# Basic Commands
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send a message when the command /start is issued."""
+    language = user_language(update)
+    await update.message.reply_html(
+        catalog.get(language, "start", user=update.effective_user.mention_html()),
+        reply_markup=start_keyboard(language)
+    )
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /help is issued."""
-    help_text = """
-*Available Commands:*
-
-*Notes Management:*
-/newnote - Create a new note
-/notes - List all your notes
-/note <id> - View a specific note
-/searchnotes <query> - Search your notes
-/deletenote <id> - Delete a note
-
-*Reminders:*
-/remind <time> <message> - Set a reminder
-/reminders - List all your reminders
-/deletereminder <id> - Delete a reminder
-
-*Preferences:*
-/theme - Set your theme preference
-/timezone - Set your timezone
-/language - Set your language
-/notifications - Configure notifications
-
-*Group Management:*
-/welcome - Set welcome message
-/rules - Set/view group rules
-/warn - Warn a user
-/unwarn - Remove warning from a user
-/ban - Ban a user
-/unban - Unban a user
-/mute - Mute a user
-/unmute - Unmute a user
-/pin - Pin a message
-/unpin - Unpin a message
-
-*Utility Commands:*
-/info - Get user info
-/id - Get chat ID
-/stats - Get chat statistics
-"""
-    await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN)
+    await update.message.reply_text(tr(update, "help"), parse_mode=ParseMode.MARKDOWN)
 
 # Notes Management
 async def new_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start the conversation to create a new note."""
-    await update.message.reply_text(
-        "Let's create a new note! First, send me the title of your note."
-    )
+    await update.message.reply_text(tr(update, "note_ask_title"))
     return TITLE
 
 async def get_note_title(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Get the title of the note and ask for content."""
     context.user_data['note_title'] = update.message.text
-    await update.message.reply_text(
-        "Great! Now send me the content of your note."
-    )
+    await update.message.reply_text(tr(update, "note_ask_content"))
     return CONTENT
 
 async def get_note_content(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Get the content of the note and ask for tags."""
     context.user_data['note_content'] = update.message.text
-    await update.message.reply_text(
-        "Optional: Send me tags for your note (space-separated) or send /skip to skip."
-    )
+    await update.message.reply_text(tr(update, "note_ask_tags"))
     return TAGS
 
 async def get_note_tags(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -146,82 +212,331 @@ async def get_note_tags(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data['note_content'],
         tags
     )
+    forget_inline_results(update.effective_user.id)
+    clear_note_draft(context)
 
-    await update.message.reply_text(
-        f"✅ Note saved successfully!\nYou can view it with /note {note_id}"
-    )
+    await update.message.reply_text(tr(update, "note_saved", note_id=note_id))
     return ConversationHandler.END
 
+def clear_note_draft(context: ContextTypes.DEFAULT_TYPE):
+    """Forget the half-written note of the user."""
+    for key in NOTE_DRAFT_KEYS:
+        context.user_data.pop(key, None)
+
+async def cancel_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Abort the note being created."""
+    clear_note_draft(context)
+    await update.message.reply_text(tr(update, "note_cancelled"))
+    return ConversationHandler.END
+
+async def note_timeout(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Discard a note draft that was abandoned."""
+    clear_note_draft(context)
+
 async def list_notes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all notes for the user."""
     notes = db.get_notes(update.effective_user.id)
-    
+    language = user_language(update)
+
     if not notes:
-        await update.message.reply_text("You don't have any notes yet. Use /newnote to create one!")
+        await update.message.reply_text(catalog.get(language, "notes_empty"))
         return
 
-    response = "*Your Notes:*\n\n"
+    response = catalog.get(language, "notes_header") + "\n\n"
     for note in notes:
         tags = ' '.join([f'#{tag}' for tag in note['tags']]) if note['tags'] else ''
-        response += f"📝 *{note['title']}* (ID: `{note['note_id']}`)\n"
-        response += f"Tags: {tags}\n\n"
+        response += catalog.get(language, "note_list_item", title=note['title'], note_id=note['note_id']) + "\n"
+        response += catalog.get(language, "note_tags", tags=tags) + "\n\n"
 
     await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
 
 async def get_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Get a specific note by ID."""
     if len(context.args) != 1:
-        await update.message.reply_text("Usage: /note <note_id>")
+        await update.message.reply_text(tr(update, "note_usage"))
         return
 
     try:
         note_id = int(context.args[0])
-        notes = db.get_notes(update.effective_user.id)
-        note = next((n for n in notes if n['note_id'] == note_id), None)
-
-        if note:
-            tags = ' '.join([f'#{tag}' for tag in note['tags']]) if note['tags'] else ''
-            response = f"📝 *{note['title']}*\n\n{note['content']}\n\n"
-            if tags:
-                response += f"Tags: {tags}\n"
-            response += f"Created: {note['created_at']}"
-            await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
-        else:
-            await update.message.reply_text("Note not found!")
     except ValueError:
-        await update.message.reply_text("Please provide a valid note ID!")
+        await update.message.reply_text(tr(update, "note_id_invalid"))
+        return
+
+    note = db.get_note(update.effective_user.id, note_id)
+    if not note:
+        await update.message.reply_text(tr(update, "note_not_found"))
+        return
+
+    tags = ' '.join([f'#{tag}' for tag in note['tags']]) if note['tags'] else ''
+    footer = ""
+    if tags:
+        footer += tr(update, "note_tags", tags=tags) + "\n"
+    footer += tr(update, "note_created", created_at=note['created_at'])
+
+    response = f"📝 *{note['title']}*\n\n{note['content']}\n\n{footer}"
+    if utf16_len(response) <= MESSAGE_LIMIT:
+        await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
+        return
+
+    # Markdown entities could be cut in half, so long notes are sent as plain text
+    text = f"📝 {note['title']}\n\n{note['content']}\n\n{footer}"
+    parts = split_message(text)
+    if len(parts) > NOTE_MAX_PARTS:
+        await update.message.reply_document(
+            document=text.encode('utf-8'),
+            filename=f"note_{note_id}.txt",
+            caption=f"📝 {note['title']}"[:1024]
+        )
+        return
+    for part in parts:
+        await update.message.reply_text(part)
+
+def utf16_len(text: str) -> int:
+    """Length of ``text`` as Telegram counts it, in UTF-16 code units."""
+    return len(text.encode('utf-16-le')) // 2
+
+def truncate_message(text: str, limit: int = MESSAGE_LIMIT) -> str:
+    """Return the longest prefix of ``text`` within ``limit`` UTF-16 code units."""
+    if utf16_len(text) <= limit:
+        return text
+    # Characters outside the BMP count twice
+    units = 0
+    for end, char in enumerate(text):
+        units += 2 if ord(char) > 0xFFFF else 1
+        if units > limit:
+            break
+    return text[:end]
+
+def split_message(text: str, limit: int = MESSAGE_LIMIT) -> list:
+    """Split ``text`` into messages Telegram accepts, breaking at newlines or spaces where possible."""
+    parts = []
+    while utf16_len(text) > limit:
+        window = truncate_message(text, limit)
+        cut = window.rfind('\n')
+        if cut <= 0:
+            cut = window.rfind(' ')
+        if cut <= 0:
+            parts.append(window)
+            text = text[len(window):]
+        else:
+            parts.append(window[:cut])
+            text = text[cut + 1:]
+    parts.append(text)
+    return parts
 
 async def search_notes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Search notes by query."""
     if len(context.args) == 0:
-        await update.message.reply_text("Usage: /searchnotes <query>")
+        await update.message.reply_text(tr(update, "search_usage"))
         return
 
     query = " ".join(context.args)
     notes = db.search_notes(update.effective_user.id, query)
+    header = tr(update, "search_header", query=escape_markdown(query))
 
     if not notes:
-        await update.message.reply_text("No notes found matching your query!")
+        # Fall back to typo-tolerant matching
+        notes = db.fuzzy_search_notes(update.effective_user.id, query)
+        header = tr(update, "search_fallback_header", query=escape_markdown(query))
+
+    await reply_note_results(update, notes, header)
+
+async def fuzzy_search_notes(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Search notes by query, tolerating typos."""
+    if len(context.args) == 0:
+        await update.message.reply_text(tr(update, "fuzzy_usage"))
         return
 
-    response = f"*Search Results for '{query}':*\n\n"
+    query = " ".join(context.args)
+    notes = db.fuzzy_search_notes(update.effective_user.id, query)
+    await reply_note_results(update, notes, tr(update, "fuzzy_header", query=escape_markdown(query)))
+
+async def reply_note_results(update: Update, notes: list, header: str):
+    """Send a list of search results."""
+    language = user_language(update)
+    if not notes:
+        await update.message.reply_text(catalog.get(language, "search_empty"))
+        return
+
+    response = header + "\n\n"
     for note in notes:
         tags = ' '.join([f'#{tag}' for tag in note['tags']]) if note['tags'] else ''
-        response += f"📝 *{note['title']}* (ID: `{note['note_id']}`)\n"
+        response += catalog.get(language, "note_list_item", title=note['title'], note_id=note['note_id']) + "\n"
         if tags:
-            response += f"Tags: {tags}\n"
+            response += catalog.get(language, "note_tags", tags=tags) + "\n"
         response += "\n"
 
     await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
 
+async def update_note_tags(update: Update, context: ContextTypes.DEFAULT_TYPE, command: str, change) -> None:
+    """Apply a tag change to one of the user's notes."""
+    if len(context.args) < 2:
+        await update.message.reply_text(tr(update, "tags_usage", command=command))
+        return
+
+    try:
+        note_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text(tr(update, "note_id_invalid"))
+        return
+
+    if change(update.effective_user.id, note_id, context.args[1:]):
+        forget_inline_results(update.effective_user.id)
+        await update.message.reply_text(tr(update, "tags_updated", note_id=note_id))
+    else:
+        await update.message.reply_text(tr(update, "note_not_found"))
+
+async def tag_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Add tags to an existing note."""
+    await update_note_tags(update, context, "tagnote", db.add_note_tags)
+
+async def untag_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Remove tags from an existing note."""
+    await update_note_tags(update, context, "untagnote", db.remove_note_tags)
+
+async def set_note_tags(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Replace all tags of an existing note."""
+    await update_note_tags(update, context, "settags", db.set_note_tags)
+
+async def list_tags(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List the tags used in this chat with their note counts."""
+    tag_counts = db.get_tag_counts(update.effective_chat.id)
+
+    if not tag_counts:
+        await update.message.reply_text(tr(update, "tags_empty"))
+        return
+
+    response = tr(update, "tags_header") + "\n\n"
+    for name, count in tag_counts:
+        response += f"#{escape_markdown(name)} — {count}\n"
+
+    await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
+
+def iter_notes_export(user_id: int):
+    """Yield the JSONL records of a user's notes export."""
+    yield {'type': 'header', 'version': NOTES_EXPORT_VERSION, 'exported_at': datetime.now(timezone.utc).isoformat()}
+    for note in db.iter_user_notes(user_id):
+        yield {'type': 'note', **note}
+    for reminder in db.iter_user_reminders(user_id):
+        yield {'type': 'reminder', **reminder}
+
+def write_notes_export(user_id: int, out) -> None:
+    """Stream a user's notes and reminders into ``out`` as gzipped JSONL."""
+    with gzip.GzipFile(fileobj=out, mode='wb') as gz:
+        for record in iter_notes_export(user_id):
+            gz.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b"\n")
+
+def iter_notes_import(stream):
+    """Yield records from an uploaded export, plain or gzipped, one line at a time."""
+    if stream.read(2) == b"\x1f\x8b":
+        stream.seek(0)
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    else:
+        stream.seek(0)
+
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # Counted as skipped by the importer
+            yield None
+
+async def export_notes(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send the user's notes and reminders as a compressed JSONL file."""
+    user_id = update.effective_user.id
+    with tempfile.TemporaryFile() as export_file:
+        await asyncio.to_thread(write_notes_export, user_id, export_file)
+        export_file.seek(0)
+        await update.message.reply_document(
+            document=export_file,
+            filename=f"notes_{user_id}.jsonl.gz",
+            caption=tr(update, "export_caption")
+        )
+
+async def import_notes(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Import notes and reminders from an uploaded /exportnotes file."""
+    message = update.message
+    document = message.document
+    if document is None and message.reply_to_message:
+        document = message.reply_to_message.document
+    if document is None:
+        await message.reply_text(tr(update, "import_usage"))
+        return
+
+    await message.reply_text(tr(update, "import_started"))
+    file = await document.get_file()
+    with tempfile.TemporaryFile() as import_file:
+        await file.download_to_memory(out=import_file)
+        import_file.seek(0)
+        try:
+            counts = await asyncio.to_thread(
+                db.import_notes,
+                update.effective_user.id,
+                iter_notes_import(import_file),
+                update.effective_chat.id
+            )
+        except (OSError, EOFError, zlib.error, sqlite3.Error) as e:
+            # Chunks imported before the failure stay imported
+            await message.reply_text(tr(update, "import_read_failed", error=str(e)))
+            return
+
+    forget_inline_results(update.effective_user.id)
+    response = tr(update, "import_done", notes=counts['notes'], reminders=counts['reminders'])
+    if counts['skipped']:
+        response += "\n" + tr(update, "import_skipped", skipped=counts['skipped'])
+    await message.reply_text(response)
+
+# Inline Note Search
+def get_inline_results(user_id: int, query: str, language: str = DEFAULT_LANGUAGE) -> list:
+    """Build inline results for a user's query, reusing recent answers."""
+    key = (user_id, query.strip().lower(), language)
+    now = time.monotonic()
+    cached = inline_results.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    results = []
+    for note in db.prefix_search_notes(user_id, query, INLINE_RESULT_LIMIT):
+        tags = ' '.join([f'#{tag}' for tag in note['tags']]) if note['tags'] else ''
+        text = f"📝 {note['title']}\n\n{note['content'] or ''}"
+        if tags:
+            text += "\n\n" + catalog.get(language, "note_tags", tags=tags)
+        results.append(
+            InlineQueryResultArticle(
+                id=str(note['note_id']),
+                title=note['title'] or catalog.get(language, "inline_note_title", note_id=note['note_id']),
+                description=(note['content'] or '')[:100],
+                input_message_content=InputTextMessageContent(truncate_message(text))
+            )
+        )
+
+    if len(inline_results) >= INLINE_RESULT_CACHE_SIZE:
+        for stale in [k for k, (expires, _) in inline_results.items() if expires <= now]:
+            del inline_results[stale]
+        if len(inline_results) >= INLINE_RESULT_CACHE_SIZE:
+            inline_results.clear()
+    inline_results[key] = (now + INLINE_RESULT_TTL, results)
+    return results
+
+def forget_inline_results(user_id: int):
+    """Drop cached inline answers of a user after their notes changed."""
+    for key in [k for k in inline_results if k[0] == user_id]:
+        del inline_results[key]
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Answer @bot queries with the user's matching notes."""
+    query = update.inline_query
+    results = get_inline_results(query.from_user.id, query.query, user_language(update))
+    await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=True)
+
 # Reminders
 async def set_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Set a reminder."""
     if len(context.args) < 2:
-        await update.message.reply_text(
-            "Usage: /remind <time> <message>\n"
-            "Example: /remind 2h30m Buy groceries"
-        )
+        await update.message.reply_text(tr(update, "remind_usage"))
         return
 
     time_str = context.args[0]
@@ -239,26 +554,18 @@ async def set_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         
         await update.message.reply_text(
-            f"✅ Reminder set!\nI'll remind you about: {message}\n"
-            f"At: {remind_at.strftime('%Y-%m-%d %H:%M:%S UTC')}"
+            tr(update, "reminder_set", message=message, remind_at=remind_at.strftime('%Y-%m-%d %H:%M:%S UTC'))
         )
     except ValueError as e:
-        await update.message.reply_text(f"Error setting reminder: {str(e)}")
+        await update.message.reply_text(tr(update, "reminder_failed", error=str(e)))
 
 # User Preferences
 async def set_theme(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Set user theme preference."""
-    keyboard = [
-        [
-            InlineKeyboardButton("🌞 Light", callback_data="theme_light"),
-            InlineKeyboardButton("🌚 Dark", callback_data="theme_dark")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
+    language = user_language(update)
     await update.message.reply_text(
-        "Choose your preferred theme:",
-        reply_markup=reply_markup
+        catalog.get(language, "theme_prompt"),
+        reply_markup=theme_keyboard(language)
     )
 
 async def set_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -270,9 +577,7 @@ async def set_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "Asia/Tokyo", "Australia/Sydney"
         ]
         timezone_list = "\n".join(common_timezones)
-        await update.message.reply_text(
-            f"Usage: /timezone <timezone>\n\nCommon timezones:\n{timezone_list}"
-        )
+        await update.message.reply_text(tr(update, "timezone_usage", timezones=timezone_list))
         return
 
     timezone_str = context.args[0]
@@ -285,9 +590,60 @@ async def set_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
         prefs['timezone'] = timezone_str
         db.set_user_preference(update.effective_user.id, prefs)
         
-        await update.message.reply_text(f"✅ Timezone set to: {timezone_str}")
+        await update.message.reply_text(tr(update, "timezone_set", timezone=timezone_str))
     except pytz.exceptions.UnknownTimeZoneError:
-        await update.message.reply_text("❌ Invalid timezone! Please use a valid timezone identifier.")
+        await update.message.reply_text(tr(update, "timezone_invalid"))
+
+async def set_notifications(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Choose how notifications are delivered and which ones are sent."""
+    user_id = update.effective_user.id
+    args = [arg.lower() for arg in context.args]
+
+    if args and args[0] in DELIVERY_MODES and len(args) <= 2:
+        prefs = db.get_user_preference(user_id)
+        prefs['notifications']['delivery'] = args[0]
+        if len(args) == 2:
+            if args[0] != 'daily' or not args[1].isdigit() or int(args[1]) > 23:
+                await update.message.reply_text(tr(update, "notifications_usage"))
+                return
+            prefs['notifications']['digest_hour'] = int(args[1])
+        db.set_user_preference(user_id, prefs)
+    elif len(args) == 2 and args[0] in NOTIFICATION_KINDS and args[1] in ('on', 'off'):
+        settings = db.get_notification_settings(user_id)
+        kinds = {kind: settings[kind] for kind in NOTIFICATION_KINDS}
+        kinds[args[0]] = args[1] == 'on'
+        db.set_notification_settings(user_id, kinds)
+    elif args:
+        await update.message.reply_text(tr(update, "notifications_usage"))
+        return
+
+    settings = db.get_notification_settings(user_id)
+    language = user_language(update)
+    await update.message.reply_text(catalog.get(
+        language,
+        "notifications_status",
+        delivery=catalog.get(
+            language,
+            f"delivery_{settings['delivery']}",
+            hour=settings['digest_hour'],
+            timezone=settings['timezone']
+        ),
+        reminders='on' if settings['reminders'] else 'off',
+        moderation='on' if settings['moderation'] else 'off'
+    ))
+
+async def set_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Set the language of the bot's replies."""
+    language = context.args[0].lower() if len(context.args) == 1 else None
+    if not catalog.supports(language):
+        languages = "\n".join(
+            f"{code} - {catalog.get(code, 'language_name')}" for code in catalog.languages
+        )
+        await update.message.reply_text(tr(update, "language_usage", languages=languages))
+        return
+
+    db.set_user_language(update.effective_user.id, language)
+    await update.message.reply_text(catalog.get(language, "language_set"))
 
 # Callback Query Handler
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -300,33 +656,11 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         prefs = db.get_user_preference(query.from_user.id)
         prefs['theme'] = theme
         db.set_user_preference(query.from_user.id, prefs)
-        await query.edit_message_text(f"✅ Theme set to: {theme}")
-    elif query.data == "help_notes":
-        text = """
-*📝 Notes Help:*
-/newnote - Create a new note
-/notes - List all notes
-/note <id> - View a note
-/searchnotes <query> - Search notes
-/deletenote <id> - Delete a note
-"""
-    elif query.data == "help_reminders":
-        text = """
-*⏰ Reminders Help:*
-/remind <time> <message> - Set a reminder
-/reminders - List all reminders
-/deletereminder <id> - Delete a reminder
-"""
-    elif query.data == "help_preferences":
-        text = """
-*⚙️ Preferences Help:*
-/theme - Set theme
-/timezone - Set timezone
-/language - Set language
-/notifications - Configure notifications
-"""
+        await query.edit_message_text(tr(update, "theme_set", theme=theme))
+    elif query.data in ("help_notes", "help_reminders", "help_preferences"):
+        text = tr(update, query.data)
     else:
-        text = "Invalid callback"
+        text = tr(update, "callback_invalid")
     
     if not query.data.startswith("theme_"):
         await query.edit_message_text(text=text, parse_mode=ParseMode.MARKDOWN)
@@ -335,117 +669,119 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def welcome(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Set welcome message for the group."""
     if not await is_admin(update, context):
-        await update.message.reply_text("❌ This command is only for admins!")
+        await update.message.reply_text(tr(update, "admin_only"))
         return
     
     if len(context.args) == 0:
         current_msg = db.get_welcome_message(update.effective_chat.id)
         if current_msg:
-            await update.message.reply_text(f"Current welcome message:\n\n{current_msg}\n\nUse /welcome <message> to change it.")
+            await update.message.reply_text(tr(update, "welcome_current", message=current_msg))
         else:
-            await update.message.reply_text("No welcome message set. Use /welcome <message> to set one.")
+            await update.message.reply_text(tr(update, "welcome_none"))
         return
         
     welcome_msg = " ".join(context.args)
     db.set_welcome_message(update.effective_chat.id, welcome_msg)
-    await update.message.reply_text(f"✅ Welcome message has been set to:\n\n{welcome_msg}")
+    await update.message.reply_text(tr(update, "welcome_set", message=welcome_msg))
 
 async def rules(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Set or view group rules."""
     if len(context.args) == 0:
-        rules_text = db.get_rules(update.effective_chat.id) or "No rules set for this group yet."
+        rules_text = db.get_rules(update.effective_chat.id) or tr(update, "rules_none")
         await update.message.reply_text(rules_text)
     else:
         if not await is_admin(update, context):
-            await update.message.reply_text("❌ Only admins can set rules!")
+            await update.message.reply_text(tr(update, "rules_admin_only"))
             return
         rules_text = " ".join(context.args)
         db.set_rules(update.effective_chat.id, rules_text)
-        await update.message.reply_text(f"✅ Rules have been updated to:\n\n{rules_text}")
+        await update.message.reply_text(tr(update, "rules_set", rules=rules_text))
 
 async def warn_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Warn a user."""
     if not await is_admin(update, context):
-        await update.message.reply_text("❌ Only admins can warn users!")
+        await update.message.reply_text(tr(update, "warn_admin_only"))
         return
 
     if not update.message.reply_to_message:
-        await update.message.reply_text("❌ Reply to a message to warn the user!")
+        await update.message.reply_text(tr(update, "warn_reply_required"))
         return
 
     user = update.message.reply_to_message.from_user
     warnings = db.add_warning(user.id)
+    log_mod_action(update, context, user.id, "warn", f"warnings={warnings}")
     
-    warn_text = f"⚠️ {user.mention_html()} has been warned.\nTotal warnings: {warnings}/3"
+    warn_text = tr(update, "warn_done", user=user.mention_html(), warnings=warnings)
     if warnings >= 3:
         # Ban user after 3 warnings
         await ban_user(update, context, user.id)
-        warn_text += "\n\n❌ User has been banned due to exceeding warning limit!"
+        warn_text += "\n\n" + tr(update, "warn_banned")
     
     await update.message.reply_html(warn_text)
 
 async def unwarn_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Remove a warning from a user."""
     if not await is_admin(update, context):
-        await update.message.reply_text("❌ Only admins can remove warnings!")
+        await update.message.reply_text(tr(update, "unwarn_admin_only"))
         return
 
     if not update.message.reply_to_message:
-        await update.message.reply_text("❌ Reply to a message to remove warning from the user!")
+        await update.message.reply_text(tr(update, "unwarn_reply_required"))
         return
 
     user = update.message.reply_to_message.from_user
     warnings = db.remove_warning(user.id)
-    await update.message.reply_html(
-        f"✅ Removed a warning from {user.mention_html()}\nCurrent warnings: {warnings}/3"
-    )
+    log_mod_action(update, context, user.id, "unwarn", f"warnings={warnings}")
+    await update.message.reply_html(tr(update, "unwarn_done", user=user.mention_html(), warnings=warnings))
 
 async def ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int = None):
     """Ban a user from the group."""
     if not await is_admin(update, context):
-        await update.message.reply_text("❌ Only admins can ban users!")
+        await update.message.reply_text(tr(update, "ban_admin_only"))
         return
 
     if user_id is None:
         if not update.message.reply_to_message:
-            await update.message.reply_text("❌ Reply to a message to ban the user!")
+            await update.message.reply_text(tr(update, "ban_reply_required"))
             return
         user_id = update.message.reply_to_message.from_user.id
 
     try:
         db.set_ban_status(user_id, True)
         await context.bot.ban_chat_member(update.effective_chat.id, user_id)
+        log_mod_action(update, context, user_id, "ban")
         user = await context.bot.get_chat_member(update.effective_chat.id, user_id)
-        await update.message.reply_html(f"🚫 {user.user.mention_html()} has been banned!")
+        await update.message.reply_html(tr(update, "ban_done", user=user.user.mention_html()))
     except Exception as e:
-        await update.message.reply_text(f"❌ Failed to ban user: {str(e)}")
+        await update.message.reply_text(tr(update, "ban_failed", error=str(e)))
 
 async def unban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Unban a user from the group."""
     if not await is_admin(update, context):
-        await update.message.reply_text("❌ Only admins can unban users!")
+        await update.message.reply_text(tr(update, "unban_admin_only"))
         return
 
     if len(context.args) != 1:
-        await update.message.reply_text("❌ Please provide the user ID to unban!")
+        await update.message.reply_text(tr(update, "unban_id_required"))
         return
 
     try:
         user_id = int(context.args[0])
         db.set_ban_status(user_id, False)
         await context.bot.unban_chat_member(update.effective_chat.id, user_id)
-        await update.message.reply_text(f"✅ User {user_id} has been unbanned!")
+        log_mod_action(update, context, user_id, "unban")
+        await update.message.reply_text(tr(update, "unban_done", user_id=user_id))
     except Exception as e:
-        await update.message.reply_text(f"❌ Failed to unban user: {str(e)}")
+        await update.message.reply_text(tr(update, "unban_failed", error=str(e)))
 
 async def mute_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Mute a user in the group."""
     if not await is_admin(update, context):
-        await update.message.reply_text("❌ Only admins can mute users!")
+        await update.message.reply_text(tr(update, "mute_admin_only"))
         return
 
     if not update.message.reply_to_message:
-        await update.message.reply_text("❌ Reply to a message to mute the user!")
+        await update.message.reply_text(tr(update, "mute_reply_required"))
         return
 
     user = update.message.reply_to_message.from_user
@@ -458,18 +794,19 @@ async def mute_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         await context.bot.restrict_chat_member(update.effective_chat.id, user.id, permissions)
-        await update.message.reply_html(f"🤐 {user.mention_html()} has been muted!")
+        log_mod_action(update, context, user.id, "mute")
+        await update.message.reply_html(tr(update, "mute_done", user=user.mention_html()))
     except Exception as e:
-        await update.message.reply_text(f"❌ Failed to mute user: {str(e)}")
+        await update.message.reply_text(tr(update, "mute_failed", error=str(e)))
 
 async def unmute_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Unmute a user in the group."""
     if not await is_admin(update, context):
-        await update.message.reply_text("❌ Only admins can unmute users!")
+        await update.message.reply_text(tr(update, "unmute_admin_only"))
         return
 
     if not update.message.reply_to_message:
-        await update.message.reply_text("❌ Reply to a message to unmute the user!")
+        await update.message.reply_text(tr(update, "unmute_reply_required"))
         return
 
     user = update.message.reply_to_message.from_user
@@ -482,18 +819,19 @@ async def unmute_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         await context.bot.restrict_chat_member(update.effective_chat.id, user.id, permissions)
-        await update.message.reply_html(f"🔊 {user.mention_html()} has been unmuted!")
+        log_mod_action(update, context, user.id, "unmute")
+        await update.message.reply_html(tr(update, "unmute_done", user=user.mention_html()))
     except Exception as e:
-        await update.message.reply_text(f"❌ Failed to unmute user: {str(e)}")
+        await update.message.reply_text(tr(update, "unmute_failed", error=str(e)))
 
 async def pin_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Pin a message in the group."""
     if not await is_admin(update, context):
-        await update.message.reply_text("❌ Only admins can pin messages!")
+        await update.message.reply_text(tr(update, "pin_admin_only"))
         return
 
     if not update.message.reply_to_message:
-        await update.message.reply_text("❌ Reply to a message to pin it!")
+        await update.message.reply_text(tr(update, "pin_reply_required"))
         return
 
     try:
@@ -501,55 +839,446 @@ async def pin_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             update.effective_chat.id,
             update.message.reply_to_message.message_id
         )
-        await update.message.reply_text("📌 Message pinned successfully!")
+        log_mod_action(
+            update,
+            context,
+            update.message.reply_to_message.from_user.id,
+            "pin",
+            f"message_id={update.message.reply_to_message.message_id}"
+        )
+        await update.message.reply_text(tr(update, "pin_done"))
     except Exception as e:
-        await update.message.reply_text(f"❌ Failed to pin message: {str(e)}")
+        await update.message.reply_text(tr(update, "pin_failed", error=str(e)))
 
 async def unpin_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Unpin a message in the group."""
     if not await is_admin(update, context):
-        await update.message.reply_text("❌ Only admins can unpin messages!")
+        await update.message.reply_text(tr(update, "unpin_admin_only"))
         return
 
     try:
         await context.bot.unpin_chat_message(update.effective_chat.id)
-        await update.message.reply_text("📌 Message unpinned successfully!")
+        log_mod_action(update, context, None, "unpin")
+        await update.message.reply_text(tr(update, "unpin_done"))
     except Exception as e:
-        await update.message.reply_text(f"❌ Failed to unpin message: {str(e)}")
+        await update.message.reply_text(tr(update, "unpin_failed", error=str(e)))
 
 async def get_user_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Get information about a user."""
     user = update.message.reply_to_message.from_user if update.message.reply_to_message else update.effective_user
     stats = db.get_user_stats(user.id)
     
-    info_text = f"""
-*User Information:*
-🆔 ID: `{user.id}`
-👤 Name: {user.full_name}
-🔰 Username: @{user.username if user.username else 'None'}
-⚠️ Warnings: {stats['warnings']}/3
-🚫 Banned: {'Yes' if stats['is_banned'] else 'No'}
-📅 Join Date: {stats['join_date'] if stats['join_date'] else 'Unknown'}
-"""
+    language = user_language(update)
+    info_text = catalog.get(
+        language,
+        "user_info",
+        user_id=user.id,
+        name=user.full_name,
+        username=user.username or catalog.get(language, "none"),
+        warnings=stats['warnings'],
+        banned=catalog.get(language, "yes" if stats['is_banned'] else "no"),
+        join_date=stats['join_date'] or catalog.get(language, "unknown")
+    )
     await update.message.reply_text(info_text, parse_mode=ParseMode.MARKDOWN)
 
+def format_welcome(template: str, **fields) -> str:
+    """Fill {user} and {group} into a welcome message set by the group admins.
+
+    Any other placeholder is left as written, so one odd field does not keep
+    the others from being filled.
+    """
+    try:
+        parsed = list(Formatter().parse(template))
+    except ValueError:
+        # Stray braces: only fill the plain placeholders
+        for name, value in fields.items():
+            template = template.replace("{" + name + "}", str(value))
+        return template
+
+    parts = []
+    for literal, field, spec, conversion in parsed:
+        parts.append(literal)
+        if field is None:
+            continue
+        placeholder = "{" + field + (f"!{conversion}" if conversion else "") + (f":{spec}" if spec else "") + "}"
+        try:
+            parts.append(placeholder.format_map(fields) if field in fields else placeholder)
+        except (ValueError, TypeError):
+            parts.append(placeholder)
+    return "".join(parts)
+
 async def handle_new_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Welcome new members to the group."""
     for member in update.message.new_chat_members:
         if member.id == context.bot.id:
-            await update.message.reply_text("👋 Thanks for adding me to the group! Use /help to see available commands.")
+            await update.message.reply_text(tr(update, "bot_added"))
             continue
             
         welcome_msg = db.get_welcome_message(update.effective_chat.id)
         if welcome_msg:
-            await update.message.reply_text(
-                welcome_msg.format(
-                    user=member.mention_html(),
-                    group=update.effective_chat.title
-                ),
-                parse_mode=ParseMode.HTML
+            welcome_msg = format_welcome(
+                welcome_msg,
+                user=member.mention_html(),
+                group=html.escape(update.effective_chat.title or "")
             )
 
+        if db.get_group_settings(update.effective_chat.id).get('welcome_card'):
+            try:
+                await send_welcome_card(update, context, member, welcome_msg)
+                continue
+            except Exception:
+                logger.exception("Failed to send welcome card, falling back to text")
+
+        if welcome_msg:
+            await update.message.reply_text(welcome_msg, parse_mode=ParseMode.HTML)
+
+async def send_welcome_card(update: Update, context: ContextTypes.DEFAULT_TYPE, member, caption: str = None):
+    """Send a rendered welcome card, reusing the uploaded file when nothing changed."""
+    chat = update.effective_chat
+    avatar = None
+    profile_photos = await context.bot.get_user_profile_photos(member.id, limit=1)
+    if profile_photos.photos:
+        sizes = profile_photos.photos[0]
+        avatar = next((size for size in sizes if size.width >= AVATAR_SIZE), sizes[-1])
+    banner = (await context.bot.get_chat(chat.id)).photo
+
+    fingerprint = card_fingerprint(
+        member.full_name,
+        chat.title,
+        avatar.file_unique_id if avatar else None,
+        banner.big_file_unique_id if banner else None
+    )
+    cached_fingerprint, file_id = db.get_welcome_card(chat.id, member.id, TEMPLATE_VERSION)
+
+    if file_id and cached_fingerprint == fingerprint:
+        photo = file_id
+    else:
+        avatar_bytes = None
+        if avatar:
+            avatar_bytes = bytes(await (await avatar.get_file()).download_as_bytearray())
+        banner_bytes = None
+        if banner:
+            banner_file = await context.bot.get_file(banner.big_file_id)
+            banner_bytes = bytes(await banner_file.download_as_bytearray())
+        photo = await welcome_cards.render(member.full_name, chat.title, avatar_bytes, banner_bytes)
+
+    message = await update.message.reply_photo(
+        photo=photo,
+        caption=caption or tr(update, "welcome_card_caption", user=member.mention_html()),
+        parse_mode=ParseMode.HTML
+    )
+    if photo is not file_id:
+        db.save_welcome_card(chat.id, member.id, TEMPLATE_VERSION, fingerprint, message.photo[-1].file_id)
+
+async def welcome_card(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Turn rendered welcome cards on or off for the group."""
+    if not await is_admin(update, context):
+        await update.message.reply_text(tr(update, "admin_only"))
+        return
+
+    if len(context.args) != 1 or context.args[0].lower() not in ("on", "off"):
+        enabled = db.get_group_settings(update.effective_chat.id).get('welcome_card', False)
+        await update.message.reply_text(tr(update, "welcome_card_status", state='on' if enabled else 'off'))
+        return
+
+    enabled = context.args[0].lower() == "on"
+    db.set_group_setting(update.effective_chat.id, 'welcome_card', enabled)
+    await update.message.reply_text(tr(update, "welcome_card_set", state='on' if enabled else 'off'))
+
+# Moderation Log
+def log_mod_action(update: Update, context: ContextTypes.DEFAULT_TYPE, target_id: int, action: str, details: str = None):
+    """Record a moderation action performed in the current chat and alert the affected user."""
+    db.log_mod_action(update.effective_chat.id, update.effective_user.id, target_id, action, details)
+    if target_id is not None and action in MOD_ALERT_ACTIONS:
+        text = catalog.get(stored_language(target_id), f"alert_{action}", group=update.effective_chat.title)
+        context.application.create_task(notify(context.bot, target_id, 'moderation', text))
+
+def format_mod_actions(actions: list, language: str) -> str:
+    """Render a page of moderation actions."""
+    lines = []
+    for action in actions:
+        line = catalog.get(
+            language,
+            "mod_action",
+            action_id=action['action_id'],
+            created_at=action['created_at'][:19],
+            action=escape_markdown(action['action']),
+            actor_id=action['actor_id']
+        )
+        if action['target_id'] is not None:
+            line += f" → `{action['target_id']}`"
+        if action['details']:
+            # Details are free text, e.g. "message_id=42"; escape them for Markdown
+            line += f" ({escape_markdown(action['details'])})"
+        lines.append(line)
+    return "\n".join(lines)
+
+async def mod_log(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the recent moderation actions of the group."""
+    if not await is_admin(update, context):
+        await update.message.reply_text(tr(update, "modlog_admin_only"))
+        return
+
+    try:
+        before_id = int(context.args[0]) if context.args else None
+    except ValueError:
+        await update.message.reply_text(tr(update, "modlog_usage"))
+        return
+
+    actions = db.get_mod_actions(update.effective_chat.id, before_id=before_id, limit=MOD_LOG_PAGE_SIZE)
+    if not actions:
+        await update.message.reply_text(tr(update, "modlog_empty"))
+        return
+
+    language = user_language(update)
+    response = catalog.get(language, "modlog_header") + "\n\n" + format_mod_actions(actions, language)
+    if len(actions) == MOD_LOG_PAGE_SIZE:
+        response += "\n\n" + catalog.get(language, "modlog_older", action_id=actions[-1]['action_id'])
+    await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
+
+async def mod_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the moderation history of a user in the group."""
+    if not await is_admin(update, context):
+        await update.message.reply_text(tr(update, "modhistory_admin_only"))
+        return
+
+    args = list(context.args)
+    try:
+        if update.message.reply_to_message:
+            user_id = update.message.reply_to_message.from_user.id
+        else:
+            user_id = int(args.pop(0))
+        before_id = int(args[0]) if args else None
+    except (IndexError, ValueError):
+        await update.message.reply_text(tr(update, "modhistory_usage"))
+        return
+
+    actions = db.get_mod_actions(
+        update.effective_chat.id, target_id=user_id, before_id=before_id, limit=MOD_LOG_PAGE_SIZE
+    )
+    if not actions:
+        await update.message.reply_text(tr(update, "modhistory_empty"))
+        return
+
+    language = user_language(update)
+    response = catalog.get(language, "modhistory_header", user_id=user_id) + "\n\n" + format_mod_actions(actions, language)
+    if len(actions) == MOD_LOG_PAGE_SIZE:
+        response += "\n\n" + catalog.get(
+            language, "modhistory_older", user_id=user_id, action_id=actions[-1]['action_id']
+        )
+    await update.message.reply_text(response, parse_mode=ParseMode.MARKDOWN)
+
+def write_mod_export(chat_id: int, fmt: str, out) -> None:
+    """Stream the moderation log of a chat into ``out`` as CSV or JSONL."""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    if fmt == "csv":
+        writer = csv.DictWriter(text, fieldnames=MOD_ACTION_COLUMNS)
+        writer.writeheader()
+        writer.writerows(db.iter_mod_actions(chat_id))
+    else:
+        for action in db.iter_mod_actions(chat_id):
+            text.write(json.dumps(action) + "\n")
+    text.flush()
+    text.detach()
+
+async def mod_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Export the full moderation log of the group as CSV or JSONL."""
+    if not await is_admin(update, context):
+        await update.message.reply_text(tr(update, "modexport_admin_only"))
+        return
+
+    fmt = context.args[0].lower() if context.args else "csv"
+    if fmt not in ("csv", "jsonl"):
+        await update.message.reply_text(tr(update, "modexport_usage"))
+        return
+
+    chat_id = update.effective_chat.id
+    with tempfile.TemporaryFile() as export_file:
+        await asyncio.to_thread(write_mod_export, chat_id, fmt, export_file)
+        export_file.seek(0)
+
+        await update.message.reply_document(
+            document=export_file,
+            filename=f"modlog_{chat_id}.{fmt}"
+        )
+
+# Notifications
+async def notify(bot, user_id: int, kind: str, text: str, chat_id: int = None):
+    """Send a notification now, or queue it for the user's next digest."""
+    settings = db.get_notification_settings(user_id)
+    if not settings[kind]:
+        return
+
+    if settings['delivery'] != 'immediate':
+        due_at = next_digest_at(settings['delivery'], settings['timezone'], settings['digest_hour'])
+        db.queue_notification(user_id, due_at, kind, text)
+        return
+
+    try:
+        await bot.send_message(chat_id or user_id, text)
+    except (Forbidden, BadRequest) as e:
+        # The user blocked the bot or never opened a private chat with it
+        logger.info("Could not notify user %s: %s", user_id, e)
+
+async def send_digest(bot, user_id: int, now: float):
+    """Send a user's due notifications as one message."""
+    queued = db.get_queued_notifications(user_id, now)
+    if not queued:
+        return
+
+    language = stored_language(user_id)
+    lines = [text for _, _, text in queued[:DIGEST_MAX_LINES]]
+    if len(queued) > DIGEST_MAX_LINES:
+        lines.append(catalog.get(language, "digest_more", count=len(queued) - DIGEST_MAX_LINES))
+    digest = catalog.get(language, "digest_header", count=len(queued)) + "\n\n" + "\n".join(lines)
+
+    try:
+        await bot.send_message(user_id, truncate_message(digest))
+    except (Forbidden, BadRequest) as e:
+        logger.info("Could not send digest to user %s: %s", user_id, e)
+    # Other errors propagate and leave the queue for the next check
+    db.delete_notifications([queue_id for queue_id, _, _ in queued])
+
+async def deliver_notifications(bot):
+    """Hand due reminders to the notification pipeline and send due digests."""
+    delivered = []
+    try:
+        for reminder in db.get_due_reminders():
+            text = catalog.get(stored_language(reminder['user_id']), "reminder_alert", content=reminder['content'])
+            await notify(bot, reminder['user_id'], 'reminders', text, reminder['group_id'])
+            delivered.append(reminder['reminder_id'])
+    finally:
+        if delivered:
+            db.complete_reminders(delivered)
+
+    now = time.time()
+    while True:
+        user_ids = db.get_due_digest_users(now, DIGEST_BATCH_USERS)
+        for user_id in user_ids:
+            await send_digest(bot, user_id, now)
+        if len(user_ids) < DIGEST_BATCH_USERS:
+            break
+
+async def deliver_notifications_periodically(application: Application):
+    """Check for due reminders and digests at a fixed interval."""
+    while True:
+        await asyncio.sleep(NOTIFICATION_INTERVAL)
+        try:
+            await deliver_notifications(application.bot)
+        except Exception:
+            logger.exception("Failed to deliver notifications")
+
+async def flush_mod_actions_periodically():
+    """Write out buffered moderation actions at a fixed interval."""
+    while True:
+        await asyncio.sleep(MOD_ACTION_FLUSH_INTERVAL)
+        try:
+            db.flush_mod_actions()
+        except Exception:
+            logger.exception("Failed to flush moderation actions")
+
+async def evict_idle_state_periodically(application: Application):
+    """Keep the in-memory user_data of idle users bounded."""
+    while True:
+        await asyncio.sleep(persistence.update_interval)
+        try:
+            persistence.evict(application)
+        except Exception:
+            logger.exception("Failed to evict idle user data")
+
+async def post_init(application: Application):
+    """Start background tasks once the application is initialized."""
+    startup.mark("initialize")
+    application.create_task(flush_mod_actions_periodically())
+    application.create_task(evict_idle_state_periodically(application))
+    application.create_task(backup_periodically())
+    application.create_task(checkpoint_periodically())
+    application.create_task(deliver_notifications_periodically(application))
+
+async def on_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Report startup timing and warm caches once the first update was served."""
+    if startup.done:
+        return
+    startup.done = True
+    startup.mark("first update")
+    logger.info(startup.report())
+    context.application.create_task(warm_up())
+
+async def warm_up():
+    """Do the startup work that can wait until updates are flowing."""
+    try:
+        await asyncio.to_thread(db.optimize)
+        if await asyncio.to_thread(db.get_groups_with_setting, 'welcome_card'):
+            welcome_cards.start()
+    except Exception:
+        logger.exception("Failed to warm up caches")
+
+async def post_shutdown(application: Application):
+    """Persist any pending state before exiting."""
+    db.flush_mod_actions()
+    welcome_cards.shutdown()
+
+# Database Backups
+async def backup_now(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Take a database snapshot right away."""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text(tr(update, "backup_admin_only"))
+        return
+
+    try:
+        name = await asyncio.to_thread(backups.create_snapshot)
+        await update.message.reply_text(tr(update, "backup_created", name=name))
+    except (BackupError, OSError, sqlite3.Error) as e:
+        await update.message.reply_text(tr(update, "backup_failed", error=str(e)))
+
+async def list_backups(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List the available database snapshots."""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text(tr(update, "backup_admin_only"))
+        return
+
+    snapshots = backups.list_snapshots()
+    if not snapshots:
+        await update.message.reply_text(tr(update, "backups_empty"))
+        return
+
+    await update.message.reply_text(tr(update, "backups_header") + "\n\n" + "\n".join(snapshots))
+
+async def restore_backup(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Restore the database from a snapshot."""
+    if update.effective_user.id not in ADMIN_IDS:
+        await update.message.reply_text(tr(update, "backup_admin_only"))
+        return
+
+    if len(context.args) != 1:
+        await update.message.reply_text(tr(update, "restore_usage"))
+        return
+
+    try:
+        safety = await asyncio.to_thread(backups.restore_snapshot, context.args[0])
+        inline_results.clear()
+        await update.message.reply_text(tr(update, "restore_done", name=context.args[0], safety=safety))
+    except (BackupError, OSError, sqlite3.Error) as e:
+        await update.message.reply_text(tr(update, "restore_failed", error=str(e)))
+
+async def backup_periodically():
+    """Take a rotated database snapshot at a fixed interval."""
+    while True:
+        await asyncio.sleep(BACKUP_INTERVAL)
+        try:
+            await asyncio.to_thread(backups.create_snapshot)
+        except Exception:
+            logger.exception("Scheduled database backup failed")
+
+async def checkpoint_periodically():
+    """Keep the WAL file from growing without bound."""
+    while True:
+        await asyncio.sleep(CHECKPOINT_INTERVAL)
+        try:
+            await asyncio.to_thread(backups.checkpoint)
+        except Exception:
+            logger.exception("WAL checkpoint failed")
+
 # Admin Utilities
 async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Check if the user is an admin."""
@@ -564,7 +1293,16 @@ async def is_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
 def main():
     """Start the bot."""
     # Create the Application
-    application = Application.builder().token(TOKEN).build()
+    startup.mark("module setup")
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .persistence(persistence)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    startup.mark("application")
 
     # Add conversation handlers
     note_conv_handler = ConversationHandler(
@@ -576,36 +1314,71 @@ def main():
                 MessageHandler(filters.TEXT & ~filters.COMMAND, get_note_tags),
                 CommandHandler("skip", get_note_tags)
             ],
+            ConversationHandler.TIMEOUT: [TypeHandler(Update, note_timeout)],
         },
-        fallbacks=[],
+        fallbacks=[CommandHandler("cancel", cancel_note)],
+        conversation_timeout=NOTE_CONVERSATION_TIMEOUT,
+        name="newnote",
+        persistent=True,
     )
-    application.add_handler(note_conv_handler)
-
-    # Add command handlers
-    application.add_handler(CommandHandler("start", start))
-    application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("notes", list_notes))
-    application.add_handler(CommandHandler("note", get_note))
-    application.add_handler(CommandHandler("searchnotes", search_notes))
-    application.add_handler(CommandHandler("remind", set_reminder))
-    application.add_handler(CommandHandler("theme", set_theme))
-    application.add_handler(CommandHandler("timezone", set_timezone))
-    
-    # Add existing handlers
-    application.add_handler(CommandHandler("welcome", welcome))
-    application.add_handler(CommandHandler("rules", rules))
-    application.add_handler(CommandHandler("warn", warn_user))
-    application.add_handler(CommandHandler("unwarn", unwarn_user))
-    application.add_handler(CommandHandler("ban", ban_user))
-    application.add_handler(CommandHandler("unban", unban_user))
-    application.add_handler(CommandHandler("mute", mute_user))
-    application.add_handler(CommandHandler("unmute", unmute_user))
-    application.add_handler(CommandHandler("pin", pin_message))
-    application.add_handler(CommandHandler("unpin", unpin_message))
-    application.add_handler(CommandHandler("info", get_user_info))
-    
-    # Add callback query handler
-    application.add_handler(CallbackQueryHandler(button_callback))
+
+    # Register all handlers in one go
+    application.add_handlers([
+        note_conv_handler,
+
+        # Commands
+        CommandHandler("start", start),
+        CommandHandler("help", help_command),
+        CommandHandler("notes", list_notes),
+        CommandHandler("note", get_note),
+        CommandHandler("searchnotes", search_notes),
+        CommandHandler("fuzzynotes", fuzzy_search_notes),
+        CommandHandler("tags", list_tags),
+        CommandHandler("tagnote", tag_note),
+        CommandHandler("untagnote", untag_note),
+        CommandHandler("settags", set_note_tags),
+        CommandHandler("exportnotes", export_notes),
+        CommandHandler("importnotes", import_notes),
+        MessageHandler(filters.Document.ALL & filters.CaptionRegex(r'^/importnotes'), import_notes),
+        CommandHandler("remind", set_reminder),
+        CommandHandler("theme", set_theme),
+        CommandHandler("timezone", set_timezone),
+        CommandHandler("language", set_language),
+        CommandHandler("notifications", set_notifications),
+
+        # Group management
+        CommandHandler("welcome", welcome),
+        CommandHandler("welcomecard", welcome_card),
+        CommandHandler("rules", rules),
+        CommandHandler("warn", warn_user),
+        CommandHandler("unwarn", unwarn_user),
+        CommandHandler("ban", ban_user),
+        CommandHandler("unban", unban_user),
+        CommandHandler("mute", mute_user),
+        CommandHandler("unmute", unmute_user),
+        CommandHandler("pin", pin_message),
+        CommandHandler("unpin", unpin_message),
+        CommandHandler("info", get_user_info),
+        CommandHandler("modlog", mod_log),
+        CommandHandler("modhistory", mod_history),
+        CommandHandler("modexport", mod_export),
+        CommandHandler("backup", backup_now),
+        CommandHandler("backups", list_backups),
+        CommandHandler("restore", restore_backup),
+
+        # Greet new members
+        MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, handle_new_member),
+
+        # Callback queries
+        CallbackQueryHandler(button_callback),
+
+        # Inline queries
+        InlineQueryHandler(inline_query)
+    ])
+
+    # Runs after every other handler group, so it sees the first update once it is served
+    application.add_handler(TypeHandler(Update, on_first_update), group=FIRST_UPDATE_GROUP)
+    startup.mark("handlers")
 
     # Start the bot
     print("✨ Bot is starting...")
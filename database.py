@@ -1,16 +1,230 @@
 import sqlite3
 import json
-from datetime import datetime
+import re
+import threading
+import time
+import zlib
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timezone
+from itertools import islice
+
+# Bump whenever init_db changes so existing databases are migrated on start
+SCHEMA_VERSION = 4
+
+# Moderation actions are buffered and written in batches
+MOD_ACTION_BATCH_SIZE = 50
+MOD_ACTION_FLUSH_INTERVAL = 5.0
+
+MOD_ACTION_COLUMNS = ('action_id', 'group_id', 'actor_id', 'target_id', 'action', 'details', 'created_at')
+
+# Rows per transaction / fetch when exporting or importing notes
+NOTES_IO_CHUNK_SIZE = 500
+
+# Number of (group, tag name) -> tag_id entries kept in memory
+TAG_CACHE_SIZE = 4096
+
+# Number of users whose note prefix index is kept in memory
+NOTE_INDEX_USERS = 256
+
+# Number of user_id -> language entries kept in memory
+LANGUAGE_CACHE_SIZE = 10000
+
+WORD_RE = re.compile(r'\w+')
+
+# Note bodies of at least this many bytes (longer than one Telegram message)
+# are stored zlib-compressed, as a BLOB whose first byte names the format;
+# shorter ones stay plain TEXT
+NOTE_COMPRESS_MIN_BYTES = 4096
+NOTE_COMPRESS_LEVEL = 6
+NOTE_FORMAT_ZLIB = b'\x01'
+
+# Fuzzy note search: minimum share of query trigrams a note must contain,
+# how many candidates are scored, and how much recency weighs in the rank
+FUZZY_MIN_SIMILARITY = 0.5
+FUZZY_CANDIDATES = 200
+FUZZY_RECENCY_WEIGHT = 0.2
+FUZZY_RECENCY_HALF_LIFE_DAYS = 30.0
+
+def trigrams(text: str) -> set:
+    """Return the set of word trigrams of ``text``, padded like pg_trgm."""
+    grams = set()
+    for word in WORD_RE.findall((text or '').lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def pack_note_content(content):
+    """Encode a note body for storage, compressing it when it is long enough to pay off."""
+    if not isinstance(content, str):
+        return content
+    data = content.encode('utf-8')
+    if len(data) < NOTE_COMPRESS_MIN_BYTES:
+        return content
+    packed = NOTE_FORMAT_ZLIB + zlib.compress(data, NOTE_COMPRESS_LEVEL)
+    return packed if len(packed) < len(data) else content
+
+def unpack_note_content(value):
+    """Decode a stored note body; plain TEXT is returned as is."""
+    if not isinstance(value, bytes):
+        return value
+    if value[:1] == NOTE_FORMAT_ZLIB:
+        return zlib.decompress(value[1:]).decode('utf-8')
+    raise ValueError(f"Unknown note content format: {value[:1]!r}")
+
+def substring_trigrams(text: str) -> set:
+    """Return the unpadded trigrams every text containing ``text`` must have in ``trigrams()``."""
+    grams = set()
+    for word in WORD_RE.findall((text or '').lower()):
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return grams
+
+def normalize_tags(tags) -> list:
+    """Strip leading '#' and drop empty or repeated tag names, keeping order."""
+    names = (str(tag).strip().lstrip('#') for tag in tags or [])
+    return list(dict.fromkeys(name for name in names if name))
+
+def _optional_str(value) -> bool:
+    return value is None or isinstance(value, str)
+
+def valid_note_record(record: dict) -> bool:
+    """Whether an imported note record has the value types the notes table expects."""
+    tags = record.get('tags')
+    return (
+        isinstance(record.get('title'), str)
+        and _optional_str(record.get('content'))
+        and (tags is None or (isinstance(tags, list) and all(isinstance(tag, str) for tag in tags)))
+        and _optional_str(record.get('created_at'))
+        and _optional_str(record.get('updated_at'))
+    )
+
+def valid_reminder_record(record: dict) -> bool:
+    """Whether an imported reminder record has the value types the reminders table expects."""
+    return (
+        isinstance(record.get('content'), str)
+        and _optional_str(record.get('remind_at'))
+        and _optional_str(record.get('created_at'))
+        and record.get('is_completed') in (None, True, False)
+    )
+
+class TagCache:
+    """LRU cache mapping (group_id, tag name) to tag_id."""
+
+    def __init__(self, maxsize: int = TAG_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, group_id: int, names: list) -> tuple:
+        """Return the cached ids for ``names`` and the names that were not cached."""
+        found = {}
+        missing = []
+        with self._lock:
+            for name in names:
+                key = (group_id, name)
+                tag_id = self._entries.get(key)
+                if tag_id is None:
+                    missing.append(name)
+                else:
+                    self._entries.move_to_end(key)
+                    found[name] = tag_id
+        return found, missing
+
+    def put_many(self, group_id: int, tag_ids: dict):
+        with self._lock:
+            for name, tag_id in tag_ids.items():
+                self._entries[(group_id, name)] = tag_id
+                self._entries.move_to_end((group_id, name))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class NotePrefixIndex:
+    """In-memory prefix index over the titles and tags of each user's notes.
+
+    A user's index is built on first use and dropped whenever their notes
+    change; only the most recently used ``max_users`` indexes are kept.
+    """
+
+    def __init__(self, max_users: int = NOTE_INDEX_USERS):
+        self.max_users = max_users
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build(rows) -> tuple:
+        """Build a user index from (note_id, title, tags) rows."""
+        tokens = set()
+        note_ids = []
+        for note_id, title, tags in rows:
+            note_ids.append(note_id)
+            for word in WORD_RE.findall(f"{title or ''} {tags or ''}".lower()):
+                tokens.add((word, note_id))
+        return sorted(tokens), sorted(note_ids, reverse=True)
+
+    def get(self, user_id: int):
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+            return index
+
+    def put(self, user_id: int, index: tuple):
+        with self._lock:
+            self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._indexes.pop(user_id, None)
+
+    @staticmethod
+    def search(index: tuple, query: str, limit: int) -> list:
+        """Return ids of notes matching every word of ``query`` as a prefix, newest first."""
+        tokens, note_ids = index
+        words = WORD_RE.findall(query.lower())
+        if not words:
+            return note_ids[:limit]
+
+        matches = None
+        for word in words:
+            found = set()
+            i = bisect_left(tokens, (word,))
+            while i < len(tokens) and tokens[i][0].startswith(word):
+                found.add(tokens[i][1])
+                i += 1
+            matches = found if matches is None else matches & found
+            if not matches:
+                return []
+        return sorted(matches, reverse=True)[:limit]
 
 class Database:
     def __init__(self, db_file="bot_data.db"):
         self.db_file = db_file
+        self._mod_actions = []
+        self._mod_actions_lock = threading.Lock()
+        self._mod_actions_last_flush = time.monotonic()
+        self._tag_cache = TagCache()
+        self._note_index = NotePrefixIndex()
+        self._languages = OrderedDict()
+        self._languages_lock = threading.Lock()
         self.init_db()
 
     def init_db(self):
         conn = sqlite3.connect(self.db_file)
         c = conn.cursor()
 
+        # Skip the DDL entirely when the schema is already up to date
+        c.execute('PRAGMA user_version')
+        if c.fetchone()[0] == SCHEMA_VERSION:
+            conn.close()
+            return
+
         # Create tables
         c.execute('''CREATE TABLE IF NOT EXISTS group_settings
                     (group_id INTEGER PRIMARY KEY,
@@ -45,6 +259,9 @@ class Database:
                      created_at TEXT,
                      updated_at TEXT)''')
 
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_notes_user
+                    ON notes (user_id, note_id)''')
+
         c.execute('''CREATE TABLE IF NOT EXISTS tags
                     (tag_id INTEGER PRIMARY KEY AUTOINCREMENT,
                      name TEXT,
@@ -56,6 +273,32 @@ class Database:
                      FOREIGN KEY(note_id) REFERENCES notes(note_id),
                      FOREIGN KEY(tag_id) REFERENCES tags(tag_id))''')
 
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_tags_group_name'")
+        if c.fetchone() is None:
+            # Merge duplicate tags left over from before tag names were unique per
+            # group. The duplicate -> kept id map is built in one sorted pass, so
+            # the rewrite is a keyed lookup per row instead of a scan per row.
+            c.execute('''CREATE TEMP TABLE tag_merge
+                        (tag_id INTEGER PRIMARY KEY, keep_id INTEGER NOT NULL)''')
+            c.execute('''INSERT INTO tag_merge (tag_id, keep_id)
+                        SELECT tag_id, keep_id FROM
+                            (SELECT tag_id, MIN(tag_id) OVER (PARTITION BY group_id, name) AS keep_id
+                             FROM tags)
+                        WHERE tag_id != keep_id''')
+            c.execute('''UPDATE note_tags SET tag_id =
+                            (SELECT keep_id FROM tag_merge WHERE tag_merge.tag_id = note_tags.tag_id)
+                        WHERE tag_id IN (SELECT tag_id FROM tag_merge)''')
+            c.execute('DELETE FROM tags WHERE tag_id IN (SELECT tag_id FROM tag_merge)')
+            c.execute('DROP TABLE tag_merge')
+            c.execute('''DELETE FROM note_tags WHERE rowid NOT IN
+                            (SELECT MIN(rowid) FROM note_tags GROUP BY note_id, tag_id)''')
+        c.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_tags_group_name
+                    ON tags (group_id, name)''')
+        c.execute('''CREATE UNIQUE INDEX IF NOT EXISTS idx_note_tags_note_tag
+                    ON note_tags (note_id, tag_id)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_note_tags_tag
+                    ON note_tags (tag_id, note_id)''')
+
         c.execute('''CREATE TABLE IF NOT EXISTS reminders
                     (reminder_id INTEGER PRIMARY KEY AUTOINCREMENT,
                      user_id INTEGER,
@@ -64,6 +307,10 @@ class Database:
                      remind_at TEXT,
                      created_at TEXT,
                      is_completed BOOLEAN DEFAULT 0)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_reminders_user
+                    ON reminders (user_id, reminder_id)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_reminders_due
+                    ON reminders (is_completed, remind_at)''')
 
         c.execute('''CREATE TABLE IF NOT EXISTS user_preferences
                     (user_id INTEGER PRIMARY KEY,
@@ -71,13 +318,120 @@ class Database:
                      timezone TEXT DEFAULT 'UTC',
                      notification_preferences TEXT)''')
 
+        # Append-only moderation audit log
+        c.execute('''CREATE TABLE IF NOT EXISTS mod_actions
+                    (action_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     group_id INTEGER NOT NULL,
+                     actor_id INTEGER,
+                     target_id INTEGER,
+                     action TEXT NOT NULL,
+                     details TEXT,
+                     created_at TEXT NOT NULL)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_mod_actions_group_target
+                    ON mod_actions (group_id, target_id, created_at)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_mod_actions_group_time
+                    ON mod_actions (group_id, created_at)''')
+
+        # Telegram file_ids of uploaded welcome cards
+        c.execute('''CREATE TABLE IF NOT EXISTS welcome_cards
+                    (group_id INTEGER,
+                     user_id INTEGER,
+                     template_version INTEGER,
+                     fingerprint TEXT,
+                     file_id TEXT,
+                     PRIMARY KEY (group_id, user_id, template_version))''')
+
+        # Conversation state and user_data kept by the persistence backend
+        c.execute('''CREATE TABLE IF NOT EXISTS persisted_user_data
+                    (user_id INTEGER PRIMARY KEY,
+                     data TEXT NOT NULL,
+                     updated_at REAL NOT NULL)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_persisted_user_data_updated
+                    ON persisted_user_data (updated_at)''')
+        c.execute('''CREATE TABLE IF NOT EXISTS persisted_conversations
+                    (name TEXT,
+                     conversation_key TEXT,
+                     state TEXT NOT NULL,
+                     updated_at REAL NOT NULL,
+                     PRIMARY KEY (name, conversation_key))''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_persisted_conversations_updated
+                    ON persisted_conversations (updated_at)''')
+
+        # Notifications waiting for a user's next digest
+        c.execute('''CREATE TABLE IF NOT EXISTS notification_queue
+                    (queue_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     user_id INTEGER NOT NULL,
+                     due_at REAL NOT NULL,
+                     kind TEXT NOT NULL,
+                     text TEXT NOT NULL)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_notification_queue_due
+                    ON notification_queue (due_at, user_id)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_notification_queue_user
+                    ON notification_queue (user_id, queue_id)''')
+
+        # Trigram index for fuzzy note search
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_trigram'")
+        backfill_trigrams = c.fetchone() is None
+        c.execute('''CREATE TABLE IF NOT EXISTS notes_trigram
+                    (user_id INTEGER,
+                     trigram TEXT,
+                     note_id INTEGER,
+                     PRIMARY KEY (user_id, trigram, note_id)) WITHOUT ROWID''')
+        if backfill_trigrams:
+            notes = conn.execute('SELECT note_id, user_id, title, content FROM notes')
+            while True:
+                rows = notes.fetchmany(NOTES_IO_CHUNK_SIZE)
+                if not rows:
+                    break
+                for note_id, user_id, title, content in rows:
+                    self._index_note_trigrams(c, note_id, user_id, title, unpack_note_content(content))
+
+        # Compress long note bodies written before compression existed
+        notes = conn.execute('''SELECT note_id, content FROM notes
+                                WHERE typeof(content) = 'text' AND length(CAST(content AS BLOB)) >= ?''',
+                             (NOTE_COMPRESS_MIN_BYTES,))
+        while True:
+            rows = notes.fetchmany(NOTES_IO_CHUNK_SIZE)
+            if not rows:
+                break
+            c.executemany('UPDATE notes SET content = ? WHERE note_id = ?',
+                          [(pack_note_content(content), note_id) for note_id, content in rows])
+
+        c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
         conn.commit()
+        # WAL lets readers and the online backup run alongside writers; the
+        # mode is stored in the database file
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.close()
+
+    def reset_caches(self):
+        """Forget cached lookups, e.g. after the database file was restored."""
+        self._tag_cache.clear()
+        self._note_index = NotePrefixIndex()
+        with self._languages_lock:
+            self._languages.clear()
+
+    def checkpoint_wal(self, mode: str = 'PASSIVE') -> tuple:
+        """Copy WAL content back into the database; returns (busy, wal_pages, checkpointed_pages)."""
+        if mode not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f"Unknown checkpoint mode: {mode}")
+        conn = sqlite3.connect(self.db_file)
+        try:
+            return conn.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+        finally:
+            conn.close()
+
+    def optimize(self):
+        """Let SQLite refresh the statistics its query planner relies on."""
+        conn = sqlite3.connect(self.db_file)
+        conn.execute('PRAGMA optimize')
         conn.close()
 
     def set_welcome_message(self, group_id: int, message: str):
         conn = sqlite3.connect(self.db_file)
         c = conn.cursor()
-        c.execute('INSERT OR REPLACE INTO group_settings (group_id, welcome_message) VALUES (?, ?)',
+        c.execute('''INSERT INTO group_settings (group_id, welcome_message) VALUES (?, ?)
+                    ON CONFLICT(group_id) DO UPDATE SET welcome_message = excluded.welcome_message''',
                  (group_id, message))
         conn.commit()
         conn.close()
@@ -93,7 +447,8 @@ class Database:
     def set_rules(self, group_id: int, rules: str):
         conn = sqlite3.connect(self.db_file)
         c = conn.cursor()
-        c.execute('INSERT OR REPLACE INTO group_settings (group_id, rules) VALUES (?, ?)',
+        c.execute('''INSERT INTO group_settings (group_id, rules) VALUES (?, ?)
+                    ON CONFLICT(group_id) DO UPDATE SET rules = excluded.rules''',
                  (group_id, rules))
         conn.commit()
         conn.close()
@@ -106,12 +461,66 @@ class Database:
         conn.close()
         return result[0] if result else None
 
+    def get_group_settings(self, group_id: int) -> dict:
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('SELECT settings FROM group_settings WHERE group_id = ?', (group_id,))
+        result = c.fetchone()
+        conn.close()
+        return json.loads(result[0]) if result and result[0] else {}
+
+    def get_groups_with_setting(self, key: str) -> list:
+        """Return the ids of groups where ``key`` is set to a truthy value."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('SELECT group_id, settings FROM group_settings WHERE settings IS NOT NULL')
+        group_ids = [group_id for group_id, settings in c.fetchall() if json.loads(settings).get(key)]
+        conn.close()
+        return group_ids
+
+    def set_group_setting(self, group_id: int, key: str, value):
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('SELECT settings FROM group_settings WHERE group_id = ?', (group_id,))
+        result = c.fetchone()
+        settings = json.loads(result[0]) if result and result[0] else {}
+        settings[key] = value
+        # Upsert so the welcome message and rules of the group are kept
+        c.execute('''INSERT INTO group_settings (group_id, settings) VALUES (?, ?)
+                    ON CONFLICT(group_id) DO UPDATE SET settings = excluded.settings''',
+                 (group_id, json.dumps(settings)))
+        conn.commit()
+        conn.close()
+
+    def get_welcome_card(self, group_id: int, user_id: int, template_version: int) -> tuple:
+        """Return the (fingerprint, file_id) of a previously uploaded welcome card."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('''SELECT fingerprint, file_id FROM welcome_cards
+                    WHERE group_id = ? AND user_id = ? AND template_version = ?''',
+                 (group_id, user_id, template_version))
+        result = c.fetchone()
+        conn.close()
+        return result if result else (None, None)
+
+    def save_welcome_card(self, group_id: int, user_id: int, template_version: int,
+                          fingerprint: str, file_id: str):
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('''INSERT OR REPLACE INTO welcome_cards
+                    (group_id, user_id, template_version, fingerprint, file_id)
+                    VALUES (?, ?, ?, ?, ?)''',
+                 (group_id, user_id, template_version, fingerprint, file_id))
+        conn.commit()
+        conn.close()
+
     def add_warning(self, user_id: int) -> int:
         conn = sqlite3.connect(self.db_file)
         c = conn.cursor()
-        c.execute('INSERT OR REPLACE INTO user_data (user_id, warnings) \
-                  VALUES (?, COALESCE((SELECT warnings + 1 FROM user_data WHERE user_id = ?), 1))',
-                 (user_id, user_id))
+        # language stays NULL until the user picks one
+        c.execute('''INSERT INTO user_data (user_id, warnings, language) VALUES (?, 1, NULL)
+                    ON CONFLICT(user_id) DO UPDATE SET warnings = warnings + 1''',
+                 (user_id,))
         c.execute('SELECT warnings FROM user_data WHERE user_id = ?', (user_id,))
         warnings = c.fetchone()[0]
         conn.commit()
@@ -133,7 +542,8 @@ class Database:
     def set_ban_status(self, user_id: int, is_banned: bool):
         conn = sqlite3.connect(self.db_file)
         c = conn.cursor()
-        c.execute('INSERT OR REPLACE INTO user_data (user_id, is_banned) VALUES (?, ?)',
+        c.execute('''INSERT INTO user_data (user_id, is_banned, language) VALUES (?, ?, NULL)
+                    ON CONFLICT(user_id) DO UPDATE SET is_banned = excluded.is_banned''',
                  (user_id, is_banned))
         conn.commit()
         conn.close()
@@ -146,6 +556,39 @@ class Database:
         conn.close()
         return bool(result[0]) if result else False
 
+    def get_user_language(self, user_id: int):
+        """Return the language a user picked, or None if they never picked one."""
+        with self._languages_lock:
+            if user_id in self._languages:
+                self._languages.move_to_end(user_id)
+                return self._languages[user_id]
+
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('SELECT language FROM user_data WHERE user_id = ?', (user_id,))
+        result = c.fetchone()
+        conn.close()
+        language = result[0] if result else None
+        self._cache_language(user_id, language)
+        return language
+
+    def set_user_language(self, user_id: int, language: str):
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('''INSERT INTO user_data (user_id, language) VALUES (?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET language = excluded.language''',
+                 (user_id, language))
+        conn.commit()
+        conn.close()
+        self._cache_language(user_id, language)
+
+    def _cache_language(self, user_id: int, language):
+        with self._languages_lock:
+            self._languages[user_id] = language
+            self._languages.move_to_end(user_id)
+            while len(self._languages) > LANGUAGE_CACHE_SIZE:
+                self._languages.popitem(last=False)
+
     def log_message(self, chat_id: int, user_id: int, message_type: str, content: str):
         conn = sqlite3.connect(self.db_file)
         c = conn.cursor()
@@ -176,62 +619,77 @@ class Database:
         
         c.execute('''INSERT INTO notes (user_id, group_id, title, content, created_at, updated_at)
                     VALUES (?, ?, ?, ?, ?, ?)''',
-                 (user_id, group_id, title, content, now, now))
+                 (user_id, group_id, title, pack_note_content(content), now, now))
         note_id = c.lastrowid
+        self._index_note_trigrams(c, note_id, user_id, title, content)
         
-        if tags:
-            for tag in tags:
-                # Create or get tag
-                c.execute('INSERT OR IGNORE INTO tags (name, group_id) VALUES (?, ?)',
-                         (tag, group_id))
-                c.execute('SELECT tag_id FROM tags WHERE name = ? AND group_id = ?',
-                         (tag, group_id))
-                tag_id = c.fetchone()[0]
-                
-                # Link note to tag
-                c.execute('INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)',
-                         (note_id, tag_id))
+        tag_ids = self._resolve_tag_ids(c, group_id, normalize_tags(tags))
+        c.executemany('INSERT OR IGNORE INTO note_tags (note_id, tag_id) VALUES (?, ?)',
+                      [(note_id, tag_id) for tag_id in tag_ids.values()])
         
         conn.commit()
         conn.close()
+        self._tag_cache.put_many(group_id, tag_ids)
+        self._note_index.invalidate(user_id)
         return note_id
 
     def get_notes(self, user_id: int, group_id: int = None) -> list:
+        """List a user's notes as id, title and tags.
+
+        Bodies are not read: title comes before content in the row, so long
+        notes' overflow pages are never touched. Use get_note for the body.
+        """
         conn = sqlite3.connect(self.db_file)
         c = conn.cursor()
-        
+
+        query = '''SELECT n.note_id, n.title, GROUP_CONCAT(t.name) as tags
+                   FROM notes n
+                   LEFT JOIN note_tags nt ON n.note_id = nt.note_id
+                   LEFT JOIN tags t ON nt.tag_id = t.tag_id
+                   WHERE n.user_id = ?'''
+        params = [user_id]
         if group_id:
-            c.execute('''SELECT n.*, GROUP_CONCAT(t.name) as tags
-                        FROM notes n
-                        LEFT JOIN note_tags nt ON n.note_id = nt.note_id
-                        LEFT JOIN tags t ON nt.tag_id = t.tag_id
-                        WHERE n.user_id = ? AND n.group_id = ?
-                        GROUP BY n.note_id''',
-                     (user_id, group_id))
-        else:
-            c.execute('''SELECT n.*, GROUP_CONCAT(t.name) as tags
-                        FROM notes n
-                        LEFT JOIN note_tags nt ON n.note_id = nt.note_id
-                        LEFT JOIN tags t ON nt.tag_id = t.tag_id
-                        WHERE n.user_id = ?
-                        GROUP BY n.note_id''',
-                     (user_id,))
-        
-        notes = []
-        for row in c.fetchall():
-            note = {
+            query += ' AND n.group_id = ?'
+            params.append(group_id)
+        c.execute(query + ' GROUP BY n.note_id', params)
+
+        notes = [
+            {
                 'note_id': row[0],
-                'title': row[3],
-                'content': row[4],
-                'created_at': row[5],
-                'updated_at': row[6],
-                'tags': row[7].split(',') if row[7] else []
+                'title': row[1],
+                'tags': row[2].split(',') if row[2] else []
             }
-            notes.append(note)
-        
+            for row in c.fetchall()
+        ]
+
         conn.close()
         return notes
 
+    def get_note(self, user_id: int, note_id: int):
+        """Return one of a user's notes with its decoded body, or None."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('''SELECT n.note_id, n.title, n.content, n.created_at, n.updated_at,
+                           GROUP_CONCAT(t.name) as tags
+                    FROM notes n
+                    LEFT JOIN note_tags nt ON n.note_id = nt.note_id
+                    LEFT JOIN tags t ON nt.tag_id = t.tag_id
+                    WHERE n.note_id = ? AND n.user_id = ?
+                    GROUP BY n.note_id''',
+                 (note_id, user_id))
+        row = c.fetchone()
+        conn.close()
+        if row is None:
+            return None
+        return {
+            'note_id': row[0],
+            'title': row[1],
+            'content': unpack_note_content(row[2]),
+            'created_at': row[3],
+            'updated_at': row[4],
+            'tags': row[5].split(',') if row[5] else []
+        }
+
     def set_reminder(self, user_id: int, group_id: int, content: str, remind_at: str) -> int:
         conn = sqlite3.connect(self.db_file)
         c = conn.cursor()
@@ -249,7 +707,8 @@ class Database:
     def get_due_reminders(self) -> list:
         conn = sqlite3.connect(self.db_file)
         c = conn.cursor()
-        now = datetime.now().isoformat()
+        # remind_at is stored as a UTC ISO timestamp
+        now = datetime.now(timezone.utc).isoformat()
         
         c.execute('''SELECT * FROM reminders 
                     WHERE remind_at <= ? AND is_completed = 0''',
@@ -270,6 +729,14 @@ class Database:
         conn.close()
         return reminders
 
+    def complete_reminders(self, reminder_ids: list):
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.executemany('UPDATE reminders SET is_completed = 1 WHERE reminder_id = ?',
+                      [(reminder_id,) for reminder_id in reminder_ids])
+        conn.commit()
+        conn.close()
+
     def set_user_preference(self, user_id: int, preferences: dict):
         conn = sqlite3.connect(self.db_file)
         c = conn.cursor()
@@ -309,28 +776,603 @@ class Database:
         return preferences
 
     def search_notes(self, user_id: int, query: str) -> list:
+        """Find notes whose title or body contains ``query``; returns id, title and tags.
+
+        When the query has trigrams, only notes holding all of them in the
+        trigram index are checked, so few compressed bodies are decoded.
+        """
         conn = sqlite3.connect(self.db_file)
+        conn.create_function('note_content', 1, unpack_note_content, deterministic=True)
         c = conn.cursor()
-        
-        c.execute('''SELECT n.*, GROUP_CONCAT(t.name) as tags
-                    FROM notes n
-                    LEFT JOIN note_tags nt ON n.note_id = nt.note_id
-                    LEFT JOIN tags t ON nt.tag_id = t.tag_id
-                    WHERE n.user_id = ? AND (n.title LIKE ? OR n.content LIKE ?)
-                    GROUP BY n.note_id''',
-                 (user_id, f'%{query}%', f'%{query}%'))
-        
+
+        grams = list(substring_trigrams(query))
+        candidates = ''
+        params = [user_id]
+        if grams:
+            candidates = f'''AND n.note_id IN (
+                              SELECT note_id FROM notes_trigram
+                              WHERE user_id = ? AND trigram IN ({','.join('?' * len(grams))})
+                              GROUP BY note_id
+                              HAVING COUNT(*) = ?)'''
+            params += [user_id, *grams, len(grams)]
+
+        c.execute(f'''SELECT n.note_id, n.title, GROUP_CONCAT(t.name) as tags
+                     FROM notes n
+                     LEFT JOIN note_tags nt ON n.note_id = nt.note_id
+                     LEFT JOIN tags t ON nt.tag_id = t.tag_id
+                     WHERE n.user_id = ? {candidates} AND (
+                         n.title LIKE ?
+                         OR CASE WHEN typeof(n.content) = 'blob' THEN note_content(n.content)
+                                 ELSE n.content END LIKE ?)
+                     GROUP BY n.note_id''',
+                  params + [f'%{query}%', f'%{query}%'])
+
+        notes = [
+            {
+                'note_id': row[0],
+                'title': row[1],
+                'tags': row[2].split(',') if row[2] else []
+            }
+            for row in c.fetchall()
+        ]
+
+        conn.close()
+        return notes
+
+    # Moderation audit log
+    def log_mod_action(self, group_id: int, actor_id: int, target_id: int, action: str, details: str = None):
+        """Queue a moderation action; the batch is written once it is full or stale."""
+        with self._mod_actions_lock:
+            self._mod_actions.append(
+                (group_id, actor_id, target_id, action, details, datetime.now().isoformat())
+            )
+            due = (len(self._mod_actions) >= MOD_ACTION_BATCH_SIZE or
+                   time.monotonic() - self._mod_actions_last_flush >= MOD_ACTION_FLUSH_INTERVAL)
+        if due:
+            self.flush_mod_actions()
+
+    def flush_mod_actions(self) -> int:
+        """Write all queued moderation actions in a single transaction."""
+        with self._mod_actions_lock:
+            pending, self._mod_actions = self._mod_actions, []
+            self._mod_actions_last_flush = time.monotonic()
+        if not pending:
+            return 0
+
+        conn = sqlite3.connect(self.db_file)
+        try:
+            with conn:
+                conn.executemany('''INSERT INTO mod_actions
+                                    (group_id, actor_id, target_id, action, details, created_at)
+                                    VALUES (?, ?, ?, ?, ?, ?)''', pending)
+        except sqlite3.Error:
+            # Put the batch back so it is retried on the next flush
+            with self._mod_actions_lock:
+                self._mod_actions[:0] = pending
+            raise
+        finally:
+            conn.close()
+        return len(pending)
+
+    def get_mod_actions(self, group_id: int, target_id: int = None,
+                        before_id: int = None, limit: int = 10) -> list:
+        """Return a page of moderation actions, newest first.
+
+        Pages are keyset-paginated: pass the action_id of the last row of the
+        previous page as ``before_id`` to get the next one.
+        """
+        self.flush_mod_actions()
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+
+        where = 'group_id = ?'
+        params = [group_id]
+        if target_id is not None:
+            where += ' AND target_id = ?'
+            params.append(target_id)
+        if before_id is not None:
+            where += ''' AND (created_at, action_id) <
+                        (SELECT created_at, action_id FROM mod_actions WHERE action_id = ?)'''
+            params.append(before_id)
+        params.append(limit)
+
+        c.execute(f'''SELECT {', '.join(MOD_ACTION_COLUMNS)} FROM mod_actions
+                     WHERE {where}
+                     ORDER BY created_at DESC, action_id DESC
+                     LIMIT ?''', params)
+        actions = [dict(zip(MOD_ACTION_COLUMNS, row)) for row in c.fetchall()]
+
+        conn.close()
+        return actions
+
+    def iter_mod_actions(self, group_id: int, batch_size: int = 1000):
+        """Yield every moderation action of a group, oldest first, without loading them all."""
+        self.flush_mod_actions()
+        conn = sqlite3.connect(self.db_file)
+        try:
+            c = conn.cursor()
+            c.execute(f'''SELECT {', '.join(MOD_ACTION_COLUMNS)} FROM mod_actions
+                         WHERE group_id = ?
+                         ORDER BY created_at, action_id''', (group_id,))
+            while True:
+                rows = c.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(MOD_ACTION_COLUMNS, row))
+        finally:
+            conn.close()
+
+    # Notes export / import
+    def _resolve_tag_ids(self, c, group_id: int, names: list) -> dict:
+        """Map tag names of a group to tag ids, creating the missing ones.
+
+        Cached names cost nothing; the rest are created with one INSERT OR
+        IGNORE batch and fetched back with a single IN query. Callers add the
+        result to the tag cache once their transaction has committed.
+        """
+        tag_ids, missing = self._tag_cache.get_many(group_id, list(dict.fromkeys(names)))
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(missing), NOTES_IO_CHUNK_SIZE):
+            batch = missing[start:start + NOTES_IO_CHUNK_SIZE]
+            c.executemany('INSERT OR IGNORE INTO tags (name, group_id) VALUES (?, ?)',
+                          [(name, group_id) for name in batch])
+            c.execute(f'''SELECT name, tag_id FROM tags
+                         WHERE group_id = ? AND name IN ({','.join('?' * len(batch))})''',
+                      [group_id, *batch])
+            tag_ids.update(c.fetchall())
+        return tag_ids
+
+    def iter_user_notes(self, user_id: int, batch_size: int = NOTES_IO_CHUNK_SIZE):
+        """Yield every note of a user with its tags, one chunk of rows at a time."""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            c = conn.cursor()
+            last_id = 0
+            while True:
+                c.execute('''SELECT note_id, group_id, title, content, created_at, updated_at
+                            FROM notes
+                            WHERE user_id = ? AND note_id > ?
+                            ORDER BY note_id
+                            LIMIT ?''',
+                         (user_id, last_id, batch_size))
+                rows = c.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                tags = {}
+                c.execute(f'''SELECT nt.note_id, t.name
+                             FROM note_tags nt JOIN tags t ON nt.tag_id = t.tag_id
+                             WHERE nt.note_id IN ({','.join('?' * len(rows))})''',
+                          [row[0] for row in rows])
+                for note_id, name in c.fetchall():
+                    tags.setdefault(note_id, []).append(name)
+
+                for row in rows:
+                    yield {
+                        'group_id': row[1],
+                        'title': row[2],
+                        'content': unpack_note_content(row[3]),
+                        'created_at': row[4],
+                        'updated_at': row[5],
+                        'tags': tags.get(row[0], [])
+                    }
+        finally:
+            conn.close()
+
+    def iter_user_reminders(self, user_id: int, batch_size: int = NOTES_IO_CHUNK_SIZE):
+        """Yield every reminder of a user."""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            c = conn.cursor()
+            c.execute('''SELECT group_id, content, remind_at, created_at, is_completed
+                        FROM reminders
+                        WHERE user_id = ?
+                        ORDER BY reminder_id''', (user_id,))
+            while True:
+                rows = c.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield {
+                        'group_id': row[0],
+                        'content': row[1],
+                        'remind_at': row[2],
+                        'created_at': row[3],
+                        'is_completed': bool(row[4])
+                    }
+        finally:
+            conn.close()
+
+    def import_notes(self, user_id: int, records, group_id: int,
+                     chunk_size: int = NOTES_IO_CHUNK_SIZE) -> dict:
+        """Insert exported note and reminder records for a user into ``group_id``.
+
+        ``records`` may be any iterable (typically a generator over an uploaded
+        file); it is consumed ``chunk_size`` records at a time and each chunk
+        is committed in its own transaction. The group_id of the records is
+        ignored, so an upload can only add to the chat it was made in; records
+        with unexpected value types are counted as skipped.
+        """
+        counts = {'notes': 0, 'reminders': 0, 'skipped': 0}
+        records = iter(records)
+        conn = sqlite3.connect(self.db_file)
+        try:
+            c = conn.cursor()
+            while True:
+                chunk = list(islice(records, chunk_size))
+                if not chunk:
+                    break
+                resolved = {}
+                with conn:
+                    self._import_chunk(c, user_id, chunk, group_id, counts, resolved)
+                self._tag_cache.put_many(group_id, resolved)
+        finally:
+            conn.close()
+            self._note_index.invalidate(user_id)
+        return counts
+
+    def _import_chunk(self, c, user_id: int, chunk: list, group_id: int,
+                      counts: dict, resolved: dict):
+        now = datetime.now().isoformat()
+        notes = []
+        reminders = []
+        for record in chunk:
+            kind = record.get('type') if isinstance(record, dict) else None
+            if kind == 'note' and valid_note_record(record):
+                record['tags'] = normalize_tags(record.get('tags'))
+                notes.append(record)
+            elif kind == 'reminder' and valid_reminder_record(record):
+                reminders.append(record)
+            elif kind != 'header':
+                counts['skipped'] += 1
+
+        # Resolve every tag of the chunk with one lookup
+        tag_ids = self._resolve_tag_ids(c, group_id, [tag for note in notes for tag in note['tags']])
+        resolved.update(tag_ids)
+
+        note_tags = []
+        for note in notes:
+            c.execute('''INSERT INTO notes (user_id, group_id, title, content, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                     (user_id, group_id, note['title'], pack_note_content(note.get('content')),
+                      note.get('created_at') or now, note.get('updated_at') or now))
+            note_id = c.lastrowid
+            self._index_note_trigrams(c, note_id, user_id, note['title'], note.get('content'))
+            note_tags.extend((note_id, tag_ids[tag]) for tag in note['tags'])
+        c.executemany('INSERT OR IGNORE INTO note_tags (note_id, tag_id) VALUES (?, ?)', note_tags)
+
+        c.executemany('''INSERT INTO reminders
+                        (user_id, group_id, content, remind_at, created_at, is_completed)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                      [(user_id, group_id, r['content'], r.get('remind_at'),
+                        r.get('created_at') or now, bool(r.get('is_completed')))
+                       for r in reminders])
+
+        counts['notes'] += len(notes)
+        counts['reminders'] += len(reminders)
+
+    # Tags
+    def _get_note_group(self, c, user_id: int, note_id: int):
+        """Return the group of one of the user's notes, or None if it does not exist."""
+        c.execute('SELECT group_id FROM notes WHERE note_id = ? AND user_id = ?', (note_id, user_id))
+        row = c.fetchone()
+        return row[0] if row else None
+
+    def add_note_tags(self, user_id: int, note_id: int, tags: list) -> bool:
+        """Attach tags to one of the user's notes. Returns False if the note does not exist."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        group_id = self._get_note_group(c, user_id, note_id)
+        if group_id is None:
+            conn.close()
+            return False
+
+        tag_ids = self._resolve_tag_ids(c, group_id, normalize_tags(tags))
+        c.executemany('INSERT OR IGNORE INTO note_tags (note_id, tag_id) VALUES (?, ?)',
+                      [(note_id, tag_id) for tag_id in tag_ids.values()])
+        c.execute('UPDATE notes SET updated_at = ? WHERE note_id = ?',
+                  (datetime.now().isoformat(), note_id))
+
+        conn.commit()
+        conn.close()
+        self._tag_cache.put_many(group_id, tag_ids)
+        self._note_index.invalidate(user_id)
+        return True
+
+    def remove_note_tags(self, user_id: int, note_id: int, tags: list) -> bool:
+        """Detach tags from one of the user's notes. Returns False if the note does not exist."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        group_id = self._get_note_group(c, user_id, note_id)
+        if group_id is None:
+            conn.close()
+            return False
+
+        names = normalize_tags(tags)
+        if names:
+            c.execute(f'''DELETE FROM note_tags
+                         WHERE note_id = ? AND tag_id IN
+                            (SELECT tag_id FROM tags
+                             WHERE group_id = ? AND name IN ({','.join('?' * len(names))}))''',
+                      [note_id, group_id, *names])
+            c.execute('UPDATE notes SET updated_at = ? WHERE note_id = ?',
+                      (datetime.now().isoformat(), note_id))
+
+        conn.commit()
+        conn.close()
+        self._note_index.invalidate(user_id)
+        return True
+
+    def set_note_tags(self, user_id: int, note_id: int, tags: list) -> bool:
+        """Replace all tags of one of the user's notes. Returns False if the note does not exist."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        group_id = self._get_note_group(c, user_id, note_id)
+        if group_id is None:
+            conn.close()
+            return False
+
+        tag_ids = self._resolve_tag_ids(c, group_id, normalize_tags(tags))
+        c.execute('DELETE FROM note_tags WHERE note_id = ?', (note_id,))
+        c.executemany('INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)',
+                      [(note_id, tag_id) for tag_id in tag_ids.values()])
+        c.execute('UPDATE notes SET updated_at = ? WHERE note_id = ?',
+                  (datetime.now().isoformat(), note_id))
+
+        conn.commit()
+        conn.close()
+        self._tag_cache.put_many(group_id, tag_ids)
+        self._note_index.invalidate(user_id)
+        return True
+
+    def get_tag_counts(self, group_id: int, limit: int = 50) -> list:
+        """Return (tag name, note count) pairs of a group, most used first."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('''SELECT t.name, COUNT(*) AS note_count
+                    FROM tags t
+                    JOIN note_tags nt ON nt.tag_id = t.tag_id
+                    WHERE t.group_id = ?
+                    GROUP BY t.name
+                    ORDER BY note_count DESC, t.name
+                    LIMIT ?''', (group_id, limit))
+        counts = c.fetchall()
+        conn.close()
+        return counts
+
+    # Inline search
+    def prefix_search_notes(self, user_id: int, query: str, limit: int = 20) -> list:
+        """Return the user's newest notes whose title or tags start with every word of ``query``."""
+        index = self._note_index.get(user_id)
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+
+        if index is None:
+            c.execute('''SELECT n.note_id, n.title, GROUP_CONCAT(t.name, ' ')
+                        FROM notes n
+                        LEFT JOIN note_tags nt ON n.note_id = nt.note_id
+                        LEFT JOIN tags t ON nt.tag_id = t.tag_id
+                        WHERE n.user_id = ?
+                        GROUP BY n.note_id''', (user_id,))
+            index = NotePrefixIndex.build(c.fetchall())
+            self._note_index.put(user_id, index)
+
+        note_ids = NotePrefixIndex.search(index, query, limit)
+        if not note_ids:
+            conn.close()
+            return []
+
+        c.execute(f'''SELECT n.note_id, n.title, n.content, GROUP_CONCAT(t.name) as tags
+                     FROM notes n
+                     LEFT JOIN note_tags nt ON n.note_id = nt.note_id
+                     LEFT JOIN tags t ON nt.tag_id = t.tag_id
+                     WHERE n.note_id IN ({','.join('?' * len(note_ids))})
+                     GROUP BY n.note_id''', note_ids)
+        rows = {row[0]: row for row in c.fetchall()}
+        conn.close()
+
+        return [
+            {
+                'note_id': note_id,
+                'title': rows[note_id][1],
+                'content': unpack_note_content(rows[note_id][2]),
+                'tags': rows[note_id][3].split(',') if rows[note_id][3] else []
+            }
+            for note_id in note_ids if note_id in rows
+        ]
+
+    # Fuzzy search
+    def _index_note_trigrams(self, c, note_id: int, user_id: int, title: str, content: str):
+        grams = trigrams(f"{title or ''} {content or ''}")
+        c.executemany('INSERT OR IGNORE INTO notes_trigram (user_id, trigram, note_id) VALUES (?, ?, ?)',
+                      [(user_id, gram, note_id) for gram in grams])
+
+    def fuzzy_search_notes(self, user_id: int, query: str, limit: int = 20,
+                           min_similarity: float = FUZZY_MIN_SIMILARITY) -> list:
+        """Search the user's notes tolerating typos, best matches first.
+
+        Similarity is the share of the query's trigrams found in the note. Only
+        the posting lists of those trigrams are read, so the cost does not grow
+        with the number of notes that do not match. Notes are ranked by
+        similarity, nudged towards recently updated ones.
+        """
+        grams = list(trigrams(query))
+        if not grams:
+            return []
+
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute(f'''SELECT note_id, COUNT(*) AS shared
+                     FROM notes_trigram
+                     WHERE user_id = ? AND trigram IN ({','.join('?' * len(grams))})
+                     GROUP BY note_id
+                     HAVING shared >= ?
+                     ORDER BY shared DESC, note_id DESC
+                     LIMIT ?''',
+                  [user_id, *grams, min_similarity * len(grams), FUZZY_CANDIDATES])
+        similarity = {note_id: shared / len(grams) for note_id, shared in c.fetchall()}
+        if not similarity:
+            conn.close()
+            return []
+
+        c.execute(f'''SELECT n.note_id, n.title, n.updated_at, GROUP_CONCAT(t.name) as tags
+                     FROM notes n
+                     LEFT JOIN note_tags nt ON n.note_id = nt.note_id
+                     LEFT JOIN tags t ON nt.tag_id = t.tag_id
+                     WHERE n.note_id IN ({','.join('?' * len(similarity))})
+                     GROUP BY n.note_id''', list(similarity))
+
+        now = datetime.now()
         notes = []
         for row in c.fetchall():
-            note = {
+            try:
+                age_days = max((now - datetime.fromisoformat(row[2])).total_seconds() / 86400, 0)
+            except (TypeError, ValueError):
+                age_days = None
+            recency = 0.0 if age_days is None else 0.5 ** (age_days / FUZZY_RECENCY_HALF_LIFE_DAYS)
+            notes.append({
                 'note_id': row[0],
-                'title': row[3],
-                'content': row[4],
-                'created_at': row[5],
-                'updated_at': row[6],
-                'tags': row[7].split(',') if row[7] else []
-            }
-            notes.append(note)
-        
+                'title': row[1],
+                'updated_at': row[2],
+                'tags': row[3].split(',') if row[3] else [],
+                'score': (1 - FUZZY_RECENCY_WEIGHT) * similarity[row[0]] + FUZZY_RECENCY_WEIGHT * recency
+            })
+
+        conn.close()
+        notes.sort(key=lambda note: note['score'], reverse=True)
+        return notes[:limit]
+
+    # Conversation persistence
+    def get_persisted_user_data(self, user_id: int, since: float):
+        """Return the stored user_data of one user, or None if there is none newer than ``since``."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('''SELECT data FROM persisted_user_data
+                    WHERE user_id = ? AND updated_at >= ?''', (user_id, since))
+        result = c.fetchone()
+        conn.close()
+        return json.loads(result[0]) if result else None
+
+    def load_persisted_conversations(self, name: str, since: float) -> dict:
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('''SELECT conversation_key, state FROM persisted_conversations
+                    WHERE name = ? AND updated_at >= ?''', (name, since))
+        conversations = {
+            tuple(json.loads(key)): json.loads(state) for key, state in c.fetchall()
+        }
+        conn.close()
+        return conversations
+
+    def save_persisted_state(self, user_data: dict, conversations: dict):
+        """Write changed user_data and conversation states in one transaction.
+
+        ``user_data`` maps user ids and ``conversations`` maps (name, key)
+        pairs to serialized values; None deletes the stored row.
+        """
+        now = time.time()
+        conn = sqlite3.connect(self.db_file)
+        try:
+            with conn:
+                conn.executemany('''INSERT OR REPLACE INTO persisted_user_data (user_id, data, updated_at)
+                                    VALUES (?, ?, ?)''',
+                                 [(user_id, data, now) for user_id, data in user_data.items()
+                                  if data is not None])
+                conn.executemany('DELETE FROM persisted_user_data WHERE user_id = ?',
+                                 [(user_id,) for user_id, data in user_data.items() if data is None])
+                conn.executemany('''INSERT OR REPLACE INTO persisted_conversations
+                                    (name, conversation_key, state, updated_at)
+                                    VALUES (?, ?, ?, ?)''',
+                                 [(name, key, state, now) for (name, key), state in conversations.items()
+                                  if state is not None])
+                conn.executemany('''DELETE FROM persisted_conversations
+                                    WHERE name = ? AND conversation_key = ?''',
+                                 [(name, key) for (name, key), state in conversations.items()
+                                  if state is None])
+        finally:
+            conn.close()
+
+    def prune_persisted_state(self, before: float):
+        """Delete stored user_data and conversations untouched since ``before``."""
+        conn = sqlite3.connect(self.db_file)
+        try:
+            with conn:
+                conn.execute('DELETE FROM persisted_user_data WHERE updated_at < ?', (before,))
+                conn.execute('DELETE FROM persisted_conversations WHERE updated_at < ?', (before,))
+        finally:
+            conn.close()
+
+    # Notifications
+    def get_notification_settings(self, user_id: int) -> dict:
+        """Return how (user_preferences) and which (user_data) notifications a user gets."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('''SELECT p.timezone, p.notification_preferences, d.notification_settings
+                    FROM (SELECT ? AS user_id) u
+                    LEFT JOIN user_preferences p ON p.user_id = u.user_id
+                    LEFT JOIN user_data d ON d.user_id = u.user_id''',
+                 (user_id,))
+        tz, preferences, settings = c.fetchone()
+        conn.close()
+
+        preferences = json.loads(preferences) if preferences else {}
+        settings = json.loads(settings) if settings else {}
+        return {
+            'timezone': tz or 'UTC',
+            'delivery': preferences.get('delivery', 'immediate'),
+            'digest_hour': preferences.get('digest_hour', 9),
+            'reminders': settings.get('reminders', True),
+            'moderation': settings.get('moderation', True)
+        }
+
+    def set_notification_settings(self, user_id: int, settings: dict):
+        """Store which kinds of notifications a user wants, e.g. {'moderation': False}."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('''INSERT INTO user_data (user_id, notification_settings, language) VALUES (?, ?, NULL)
+                    ON CONFLICT(user_id) DO UPDATE SET notification_settings = excluded.notification_settings''',
+                 (user_id, json.dumps(settings)))
+        conn.commit()
+        conn.close()
+
+    def queue_notification(self, user_id: int, due_at: float, kind: str, text: str):
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('INSERT INTO notification_queue (user_id, due_at, kind, text) VALUES (?, ?, ?, ?)',
+                 (user_id, due_at, kind, text))
+        conn.commit()
+        conn.close()
+
+    def get_due_digest_users(self, now: float, limit: int) -> list:
+        """Return users with queued notifications due by ``now``; only due rows are read."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        # Ordering by due_at keeps the planner on the due index, longest waiting first
+        c.execute('''SELECT DISTINCT user_id FROM notification_queue
+                    WHERE due_at <= ? ORDER BY due_at LIMIT ?''',
+                 (now, limit))
+        user_ids = [row[0] for row in c.fetchall()]
+        conn.close()
+        return user_ids
+
+    def get_queued_notifications(self, user_id: int, now: float) -> list:
+        """Return the (queue_id, kind, text) of a user's notifications due by ``now``, oldest first."""
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.execute('''SELECT queue_id, kind, text FROM notification_queue
+                    WHERE user_id = ? AND due_at <= ?
+                    ORDER BY queue_id''',
+                 (user_id, now))
+        rows = c.fetchall()
+        conn.close()
+        return rows
+
+    def delete_notifications(self, queue_ids: list):
+        conn = sqlite3.connect(self.db_file)
+        c = conn.cursor()
+        c.executemany('DELETE FROM notification_queue WHERE queue_id = ?',
+                      [(queue_id,) for queue_id in queue_ids])
+        conn.commit()
         conn.close()
-        return notes 
\ No newline at end of file
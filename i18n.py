@@ -0,0 +1,53 @@
+import json
+import os
+from string import Formatter
+
+LOCALES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+DEFAULT_LANGUAGE = "en"
+
+def compile_template(template: str):
+    """Turn a message template into a callable taking the template fields as keywords.
+
+    Templates without fields are rendered once here, so using them later
+    costs nothing but the call.
+    """
+    if any(field is not None for _, field, _, _ in Formatter().parse(template)):
+        return template.format
+    text = template.format()
+    return lambda **kwargs: text
+
+class Catalog:
+    """Compiled message templates of every language in ``locales_dir``.
+
+    Each ``<language>.json`` file maps message keys to templates; a template
+    may be given as a list of lines. Keys missing from a language fall back
+    to the default language.
+    """
+
+    def __init__(self, locales_dir: str = LOCALES_DIR, default: str = DEFAULT_LANGUAGE):
+        self.default = default
+        self._messages = {}
+        for file_name in sorted(os.listdir(locales_dir)):
+            language, ext = os.path.splitext(file_name)
+            if ext != ".json":
+                continue
+            with open(os.path.join(locales_dir, file_name), encoding="utf-8") as f:
+                templates = json.load(f)
+            self._messages[language] = {
+                key: compile_template("\n".join(value) if isinstance(value, list) else value)
+                for key, value in templates.items()
+            }
+
+        fallback = self._messages[default]
+        for messages in self._messages.values():
+            for key, render in fallback.items():
+                messages.setdefault(key, render)
+        self.languages = tuple(sorted(self._messages))
+
+    def supports(self, language: str) -> bool:
+        return language in self._messages
+
+    def get(self, language: str, key: str, **kwargs) -> str:
+        """Render message ``key`` in ``language``."""
+        messages = self._messages.get(language) or self._messages[self.default]
+        return messages[key](**kwargs)
@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta, timezone
+
+import pytz
+
+DELIVERY_MODES = ('immediate', 'hourly', 'daily')
+NOTIFICATION_KINDS = ('reminders', 'moderation')
+
+# Seconds between checks for due reminders and digests
+NOTIFICATION_INTERVAL = 30
+# Digests sent per check, and notifications listed in one digest
+DIGEST_BATCH_USERS = 50
+DIGEST_MAX_LINES = 30
+
+def next_digest_at(delivery: str, tz_name: str, digest_hour: int = 9, now: datetime = None) -> float:
+    """Return the UTC timestamp of the next hourly or daily digest in the user's timezone."""
+    try:
+        tz = pytz.timezone(tz_name)
+    except pytz.exceptions.UnknownTimeZoneError:
+        tz = pytz.utc
+    local = (now or datetime.now(timezone.utc)).astimezone(tz)
+
+    if delivery == 'hourly':
+        # Whole hours in local time, so half-hour offsets get their own boundary
+        due = local.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        return due.timestamp()
+
+    due = local.replace(hour=digest_hour, minute=0, second=0, microsecond=0, tzinfo=None)
+    if due <= local.replace(tzinfo=None):
+        due += timedelta(days=1)
+    # localize() picks the right UTC offset across a DST change
+    return tz.localize(due).timestamp()
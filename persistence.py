@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+# Seconds between the Application's persistence runs
+PERSISTENCE_UPDATE_INTERVAL = 30
+# user_data untouched for this long is evicted from memory (it stays in SQLite)
+USER_DATA_IDLE_TIMEOUT = 30 * 60
+# At most this many users keep their user_data in memory
+USER_DATA_MAX_USERS = 10000
+# Stored state untouched for this long is deleted
+STATE_RETENTION = 7 * 24 * 3600
+
+class SQLitePersistence(BasePersistence):
+    """Persist user_data and conversation states in the bot's SQLite database.
+
+    Only values that changed since they were last written are flushed, all
+    in one transaction per persistence run. user_data is loaded lazily on a
+    user's first update; idle users are evicted from memory and reloaded the
+    same way, so memory stays bounded by ``max_users``.
+    """
+
+    def __init__(self, db: Database, conversation_timeout: float = None,
+                 idle_timeout: float = USER_DATA_IDLE_TIMEOUT,
+                 max_users: int = USER_DATA_MAX_USERS,
+                 retention: float = STATE_RETENTION,
+                 update_interval: float = PERSISTENCE_UPDATE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db = db
+        self.conversation_timeout = conversation_timeout
+        self.idle_timeout = idle_timeout
+        self.max_users = max_users
+        self.retention = retention
+
+        # Last serialized value per resident user, to skip unchanged writes
+        self._stored = {}
+        self._last_seen = {}
+        self._evicting = set()
+        self._pending_user_data = {}
+        self._pending_conversations = {}
+        self._flush_scheduled = False
+
+    # user_data
+    async def get_user_data(self) -> dict:
+        # Nothing is preloaded so startup stays fast; each user's data is
+        # loaded by refresh_user_data on their first update
+        return {}
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        serialized = json.dumps(data, sort_keys=True) if data else None
+        if self._stored.get(user_id) == serialized:
+            return
+        self._stored[user_id] = serialized
+        self._pending_user_data[user_id] = serialized
+        self._schedule_flush()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        self._last_seen[user_id] = time.monotonic()
+        if user_id in self._stored:
+            return
+        # First update since startup or eviction: load what was stored
+        stored = self.db.get_persisted_user_data(user_id, time.time() - self.retention)
+        if stored:
+            user_data.update(stored)
+        self._stored[user_id] = json.dumps(stored, sort_keys=True) if stored else None
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if user_id in self._evicting:
+            # Evicted from memory only; keep the stored copy
+            self._evicting.discard(user_id)
+            return
+        self._stored.pop(user_id, None)
+        self._pending_user_data[user_id] = None
+        self._schedule_flush()
+
+    # Conversations
+    async def get_conversations(self, name: str) -> dict:
+        # Conversations that would have timed out while the bot was down are dropped
+        since = time.time() - (self.conversation_timeout or self.retention)
+        return self.db.load_persisted_conversations(name, since)
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        state = json.dumps(new_state) if new_state is not None else None
+        self._pending_conversations[(name, json.dumps(list(key)))] = state
+        self._schedule_flush()
+
+    # chat_data, bot_data and callback_data are not stored
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # Writing
+    def _schedule_flush(self):
+        # All updates of one persistence run are gathered; write them together
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._write_pending)
+
+    def _write_pending(self):
+        self._flush_scheduled = False
+        user_data, self._pending_user_data = self._pending_user_data, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        if not user_data and not conversations:
+            return
+        try:
+            self.db.save_persisted_state(user_data, conversations)
+        except Exception:
+            logger.exception("Failed to persist conversation state")
+            # Keep newer pending values over the failed ones
+            self._pending_user_data = {**user_data, **self._pending_user_data}
+            self._pending_conversations = {**conversations, **self._pending_conversations}
+
+    async def flush(self) -> None:
+        self._write_pending()
+
+    # Memory bound
+    def evict(self, application) -> int:
+        """Drop idle users' data from memory, oldest first, and prune expired state."""
+        now = time.monotonic()
+        resident = sorted(application.user_data, key=lambda user_id: self._last_seen.get(user_id, 0))
+        # Never evict users whose latest change may not have been written yet
+        min_idle = 2 * self.update_interval
+        overflow = len(resident) - self.max_users
+
+        evicted = 0
+        for user_id in resident:
+            idle = now - self._last_seen.get(user_id, 0)
+            if idle < self.idle_timeout and (evicted >= overflow or idle < min_idle):
+                break
+            self._evicting.add(user_id)
+            self._stored.pop(user_id, None)
+            self._last_seen.pop(user_id, None)
+            application.drop_user_data(user_id)
+            evicted += 1
+
+        self.db.prune_persisted_state(time.time() - self.retention)
+        return evicted
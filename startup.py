@@ -0,0 +1,29 @@
+import time
+
+class StartupTimer:
+    """Measure how long each startup phase takes, up to the first handled update."""
+
+    def __init__(self, started: float = None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = []
+        self.done = False
+        self._last = self.started
+
+    def mark(self, phase: str) -> float:
+        """Close the current phase under the name ``phase`` and return its duration."""
+        now = time.perf_counter()
+        duration = now - self._last
+        self.phases.append((phase, duration))
+        self._last = now
+        return duration
+
+    @property
+    def elapsed(self) -> float:
+        return self._last - self.started
+
+    def report(self) -> str:
+        lines = ["Startup timing:"]
+        for phase, duration in self.phases:
+            lines.append(f"  {phase:<20} {duration * 1000:9.1f} ms")
+        lines.append(f"  {'total':<20} {self.elapsed * 1000:9.1f} ms")
+        return "\n".join(lines)
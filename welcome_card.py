@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# Bump whenever the card layout changes so cached cards are re-rendered
+TEMPLATE_VERSION = 1
+
+CARD_SIZE = (1000, 360)
+AVATAR_SIZE = 200
+BACKGROUND_COLOR = (36, 41, 56)
+TEXT_COLOR = (255, 255, 255)
+SUBTEXT_COLOR = (180, 188, 208)
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+BANNER_FILE = os.path.join(ASSETS_DIR, "welcome_banner.png")
+FONT_FILES = (
+    os.path.join(ASSETS_DIR, "welcome_font.ttf"),
+    "DejaVuSans-Bold.ttf",
+)
+
+# Worker processes render cards; keep it small, rendering is short and bursty
+RENDER_WORKERS = int(os.getenv("WELCOME_CARD_WORKERS", "2"))
+
+# Decoded template assets, loaded once per worker process. Pillow itself is
+# only imported by the workers, keeping it off the bot's startup path.
+_assets = None
+
+def _load_font(size: int):
+    from PIL import ImageFont
+    for font_file in FONT_FILES:
+        try:
+            return ImageFont.truetype(font_file, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+def _load_assets():
+    """Decode the template assets of this process."""
+    from PIL import Image, ImageDraw, ImageOps
+    global _assets
+    if os.path.exists(BANNER_FILE):
+        with Image.open(BANNER_FILE) as banner:
+            background = ImageOps.fit(banner.convert("RGB"), CARD_SIZE)
+    else:
+        background = Image.new("RGB", CARD_SIZE, BACKGROUND_COLOR)
+
+    mask = Image.new("L", (AVATAR_SIZE, AVATAR_SIZE), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, AVATAR_SIZE, AVATAR_SIZE), fill=255)
+
+    _assets = {
+        "background": background,
+        "avatar_mask": mask,
+        "title_font": _load_font(48),
+        "subtitle_font": _load_font(34),
+    }
+    return _assets
+
+def _fit_text(draw, text: str, font, max_width: int) -> str:
+    if draw.textlength(text, font=font) <= max_width:
+        return text
+    while text and draw.textlength(text + "…", font=font) > max_width:
+        text = text[:-1]
+    return text + "…"
+
+def render_card(user_name: str, group_title: str, avatar: bytes = None, banner: bytes = None) -> bytes:
+    """Render a welcome card as PNG bytes.
+
+    Runs inside a worker process; ``avatar`` and ``banner`` are the raw bytes
+    of the user's profile photo and the group photo, if any.
+    """
+    from PIL import Image, ImageDraw, ImageOps
+    assets = _assets or _load_assets()
+    width, height = CARD_SIZE
+
+    if banner:
+        with Image.open(io.BytesIO(banner)) as group_photo:
+            card = ImageOps.fit(group_photo.convert("RGB"), CARD_SIZE)
+        # Darken the group photo so the text stays readable
+        card = Image.blend(card, assets["background"], 0.6)
+    else:
+        card = assets["background"].copy()
+
+    avatar_box = (60, (height - AVATAR_SIZE) // 2)
+    if avatar:
+        with Image.open(io.BytesIO(avatar)) as user_photo:
+            face = ImageOps.fit(user_photo.convert("RGB"), (AVATAR_SIZE, AVATAR_SIZE))
+        card.paste(face, avatar_box, assets["avatar_mask"])
+    else:
+        initial = Image.new("RGB", (AVATAR_SIZE, AVATAR_SIZE), SUBTEXT_COLOR)
+        ImageDraw.Draw(initial).text(
+            (AVATAR_SIZE // 2, AVATAR_SIZE // 2),
+            (user_name or "?")[:1].upper(),
+            font=assets["title_font"],
+            fill=BACKGROUND_COLOR,
+            anchor="mm",
+        )
+        card.paste(initial, avatar_box, assets["avatar_mask"])
+
+    draw = ImageDraw.Draw(card)
+    text_x = avatar_box[0] + AVATAR_SIZE + 50
+    max_width = width - text_x - 40
+    draw.text(
+        (text_x, height // 2 - 10),
+        _fit_text(draw, f"Welcome, {user_name}!", assets["title_font"], max_width),
+        font=assets["title_font"],
+        fill=TEXT_COLOR,
+        anchor="ls",
+    )
+    draw.text(
+        (text_x, height // 2 + 50),
+        _fit_text(draw, f"to {group_title}", assets["subtitle_font"], max_width),
+        font=assets["subtitle_font"],
+        fill=SUBTEXT_COLOR,
+        anchor="ls",
+    )
+
+    out = io.BytesIO()
+    card.save(out, format="PNG", optimize=False)
+    return out.getvalue()
+
+def card_fingerprint(user_name: str, group_title: str, avatar_id: str = None, banner_id: str = None) -> str:
+    """Identify the inputs of a card so a changed name or photo triggers a re-render."""
+    key = "\0".join([str(TEMPLATE_VERSION), user_name or "", group_title or "", avatar_id or "", banner_id or ""])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+class WelcomeCardRenderer:
+    """Renders welcome cards in a process pool, away from the event loop."""
+
+    def __init__(self, workers: int = RENDER_WORKERS):
+        self.workers = workers
+        self._pool = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_load_assets)
+        return self._pool
+
+    async def render(self, user_name: str, group_title: str, avatar: bytes = None, banner: bytes = None) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_pool(), render_card, user_name, group_title, avatar, banner
+        )
+
+    def start(self):
+        """Spawn a worker and decode the template assets ahead of the first card."""
+        self._get_pool().submit(_load_assets)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None